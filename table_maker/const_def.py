@@ -1,7 +1,26 @@
 from enum import Enum, auto
+import os
 
 SITE_CHAR={":", "："}
 
+# 样式编译结果、页面文本等缓存文件的默认目录
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".table_maker", "cache")
+
+# 作为样式序号传给提取时，自动识别样式
+AUTO_STYLE = -1
+
+class ExtractEvent(Enum):
+    # 载荷为(页号, 总页数)
+    Page = 0
+    # 载荷为一个泵的MatchedArg
+    Pump = 1
+    # 载荷为取消时的页号
+    Cancelled = 2
+    # 载荷为错误信息
+    Error = 3
+    # 设置了资源限制或去重时最后产出，载荷为ExtractReport
+    Report = 4
+
 class ArgType(Enum):
     Common = 0
     Medium = 1
@@ -1,15 +1,58 @@
 
 import pymupdf
+import time
 import traceback
 import json
-from .file_style import CNPC1, default, Sinopec1, base_matcher
+from .file_style import base_matcher
+from .file_style.compiled_style import CompiledConfig, CompiledStyle, StyleConfigError, compile_config
+from .style_cache import StyleCache
+from .page_text import PageText, PageTextCache, document_key, extract_page_text
+from .parallel_extract import extract_parallel
+from .doc_index import DocumentIndex
+from .word_store import WordStore, StoredDocument
+from .matcher_priors import PriorStore
+from .segment_cache import SegmentCache, page_content_hash
+from .result_cache import ResultCache
+from .result_diff import diff_results
+from .memory_usage import current_rss, peak_rss
+from .segmenter import segment_document
+from .extract_limits import ExtractLimits, ExtractReport, is_textless
+from .const_def import AUTO_STYLE, ExtractEvent
+
+# 自动识别样式时最多读取的页数
+DETECT_PAGES = 6
 
 class DataExtractor():
-    def __init__(self) -> None:
+    def __init__(self, style_cache: StyleCache|None = None, word_store: WordStore|None = None,
+                 prior_store: PriorStore|None = None, use_priors: bool = False,
+                 segment_cache: SegmentCache|None = None, result_cache: ResultCache|None = None) -> None:
         self._pattern_f = {
         }
         self._pump_setting = {}
         self._display_list = []
+        self._compiled = None
+        self._style_cache = style_cache if style_cache is not None else StyleCache()
+        # 提取和写回共用的页面文本
+        self._page_cache = PageTextCache()
+        # ((文档键, 区域配置), (倒排索引, 各页文本))，只保留最近一个文档
+        self._doc_index = None
+        # 可选的词表持久化缓存，及最近打开的(内容哈希, 缓存文档)
+        self._word_store = word_store
+        self._stored = None
+        # 可选的匹配器历史统计，按(配置内容哈希, 样式序号)保存
+        self._prior_store = prior_store
+        self._use_priors = use_priors
+        self._conf_key = None
+        # 可选的分段结果缓存，用于修订版文档的增量提取
+        self._segment_cache = segment_cache
+        # 可选的整份文档提取结果缓存
+        self._result_cache = result_cache
+        # 最近一次自动识别的(样式序号, 得分)
+        self._detected = None
+        # 最近一次设置了资源限制的提取报告
+        self._report = None
+        # (文档与页码规则, 分段表)，只保留最近一个文档
+        self._segment_table = None
 
     @property
     def display_list(self):
@@ -19,55 +62,536 @@ class DataExtractor():
     def pump_setting(self) -> tuple:
         return self._pump_setting
 
+    @property
+    def detected(self) -> tuple|None:
+        return self._detected
+
+    @property
+    def report(self) -> ExtractReport|None:
+        return self._report
+
+    @property
+    def result_cache(self) -> ResultCache|None:
+        return self._result_cache
+
+    @property
+    def compiled(self) -> CompiledConfig|None:
+        return self._compiled
+
+    def compile_file(self, file: str) -> tuple:
+        '''读取并编译配置文件，返回(配置内容哈希, CompiledConfig)'''
+        with open(file, "rb") as conf:
+            raw = conf.read()
+        key = self._style_cache.content_key(raw)
+        compiled = self._style_cache.load(key)
+        if compiled is None:
+            compiled = compile_config(json.loads(raw.decode("utf-8")))
+            self._style_cache.save(key, compiled)
+        return (key, compiled)
+
     def load_conf(self, file:str):
-        #temp_list = [default.DefaultFileStyle(), CNPC1.CNPC1FileStyle(), Sinopec1.Sinopec1FileStyle()]
-        conf = open(file, encoding="utf-8")
         try:
-            self._display_list.clear()
-            styles = json.load(conf)
-            self._pump_setting["flow_gap"] = styles["pump"]["flow_gap"]
-            self._pump_setting["lift_gap"] = styles["pump"]["lift_gap"]
-            for i, style in enumerate(styles["styles"]):
-                parser = base_matcher.BasicFileStyle()
-                parser.setup(style["settings"])
-                self._pattern_f[i] = parser
-                self._display_list.append(style["name"])
+            key, compiled = self.compile_file(file)
+            self.load_compiled(compiled, key)
             return None
+        except StyleConfigError as e:
+            traceback.print_exc()
+            return str(e)
         except:
             traceback.print_exc() 
             return "json格式错误"
-        finally:
-            conf.close()
 
-    def writeback(self, src_file:str, filepath: str, pattern: int, data: list):
+    def load_compiled(self, compiled: CompiledConfig, conf_key: str|None = None):
+        self._compiled = compiled
+        self._conf_key = conf_key
+        self._pattern_f.clear()
+        self._display_list.clear()
+        self._pump_setting.update(compiled.pump_setting)
+        for i, style in enumerate(compiled.styles):
+            parser = base_matcher.BasicFileStyle()
+            parser.load(style)
+            if self._prior_store is not None and conf_key is not None:
+                parser.set_priors(self._prior_store.load(f"{conf_key}-{i}"), self._use_priors)
+            self._pattern_f[i] = parser
+            self._display_list.append(style.name)
+
+    def open_stored(self, filepath: str) -> tuple:
+        '''返回(内容哈希, 缓存文档)，未启用词表缓存时返回(None, None)'''
+        if self._word_store is None:
+            return (None, None)
+        key = self._word_store.content_key(filepath)
+        if self._stored is not None and self._stored[0] == key:
+            return self._stored
+        stored = self._word_store.open(key)
+        if stored is not None:
+            if self._stored is not None:
+                self._stored[1].close()
+            self._stored = (key, stored)
+        return (key, stored)
+
+    @staticmethod
+    def _segment_key(doc_key, matcher):
+        style = matcher.style
+        return (doc_key, style.page_num, style.clips, style.dedup)
+
+    def cached_segments(self, doc_key, matcher):
+        if doc_key is None or self._segment_table is None:
+            return None
+        if self._segment_table[0] != self._segment_key(doc_key, matcher):
+            return None
+        return self._segment_table[1]
+
+    def cached_starts(self, doc_key, matcher):
+        table = self.cached_segments(doc_key, matcher)
+        if table is None:
+            return None
+        return {first for first, _ in table}
+
+    def segments(self, filepath: str, pattern: int):
+        '''
+        返回分段表[(起始页, 结束页)]，第i项为第i个泵的页范围；
+        同一文件和页码规则复用上次的结果，之后的提取、写回和按泵重新提取都会使用
+        '''
         try:
             matcher = self._pattern_f.get(pattern)
             if matcher is None:
                 return None
+            pdf_doc = pymupdf.open(filepath)
+            doc_key = document_key(pdf_doc)
+            table = self.cached_segments(doc_key, matcher)
+            if table is None:
+                table = segment_document(pdf_doc, matcher)
+                if doc_key is not None:
+                    self._segment_table = (self._segment_key(doc_key, matcher), table)
+            pdf_doc.close()
+            return table
+        except Exception:
+            traceback.print_exc()
+            return None
+
+    def extract_pumps(self, filepath: str, pattern: int, pumps: list):
+        '''按分段表只重新提取指定序号的泵，返回与pumps对应的结果'''
+        try:
+            table = self.segments(filepath, pattern)
+            if table is None:
+                return None
+            matcher = self._pattern_f[pattern]
+            matcher.refresh_priors()
+            pdf_doc = pymupdf.open(filepath)
+            doc_key = document_key(pdf_doc)
+            result = []
+            for n in pumps:
+                first, last = table[n]
+                result.append(self.extract_segment(pdf_doc, doc_key, matcher, first, last))
+            pdf_doc.close()
+            return result
+        except Exception:
+            traceback.print_exc()
+            return None
+
+    def relieve_memory(self, limits: ExtractLimits, report: ExtractReport):
+        '''常驻内存超出预算时清空页面文本缓存和MuPDF的对象缓存'''
+        rss = current_rss()
+        if rss is not None and rss > limits.memory_mb * 1024 * 1024:
+            self._page_cache.clear()
+            pymupdf.TOOLS.store_shrink(100)
+            report.add_shrink()
+
+    def writeback(self, src_file:str, filepath: str, pattern: int, data: list, limits: ExtractLimits|None = None):
+        '''设置limits.memory_mb时不缓存页面文本，内存使用情况见report'''
+        try:
+            self._report = None
+            matcher = self._pattern_f.get(pattern)
+            if matcher is None:
+                return None
+            bounded = limits is not None and limits.memory_mb is not None
+            report = ExtractReport()
+            store_key, stored = self.open_stored(src_file)
+            if bounded:
+                # 不保留整份文档的文本
+                store_key = None
             pdf_doc = pymupdf.open(src_file)
+            doc_key = document_key(pdf_doc)
             data.reverse()
             temp_data = []
             temp_data.extend(data)
+            clips = matcher.style.clips
+            starts = self.cached_starts(doc_key, matcher)
+            texts = []
             for page in pdf_doc:
-                matcher.writeback(page, temp_data)
+                if stored is not None:
+                    if matcher.can_skip(page.number, stored, writeback=True):
+                        continue
+                    text = stored.page_text(page.number).set_clips(clips)
+                else:
+                    text = self._page_cache.get(doc_key, page.number, clips)
+                    if text is None and store_key is None and matcher.can_skip(page.number, page=page, writeback=True, starts=starts):
+                        continue
+                    # 写入前提取，保证与原文件的文本一致
+                    if text is None and bounded:
+                        text = extract_page_text(page, clips)
+                    else:
+                        text = self._page_cache.load(doc_key, page, clips)
+                    if store_key is not None:
+                        texts.append(text)
+                matcher.writeback(page, text, temp_data)
+                text = None
+                if bounded:
+                    self.relieve_memory(limits, report)
             pdf_doc.save(filepath)
             pdf_doc.close()
+            self.save_stored(store_key, stored, texts)
+            report.peak_rss = peak_rss()
+            self._report = report
             return None
         except Exception:
             traceback.print_exc() 
             return "写回失败"
 
-    def extract(self, filepath: str, pattern: int):
+    def save_stored(self, store_key, stored: StoredDocument|None, texts: list):
+        # 只按区域提取的文本不是整页内容，不能写入词表缓存
+        if store_key is None or stored is not None:
+            return
+        if all(text.complete for text in texts):
+            self._word_store.save(store_key, texts)
+
+    def save_priors(self, pattern: int):
+        matcher = self._pattern_f[pattern]
+        if self._prior_store is not None and matcher.priors is not None:
+            self._prior_store.save(f"{self._conf_key}-{pattern}", matcher.priors)
+
+    def get_index(self, pdf_doc: pymupdf.Document, doc_key, clips: tuple = ()) -> tuple:
+        '''
+        为文档建立倒排索引，返回(索引, 各页文本)；各页文本随索引保留，提取时不再重复提取，
+        同一文件和区域配置的后续提取直接复用
+        '''
+        if doc_key is not None and self._doc_index is not None and self._doc_index[0] == (doc_key, clips):
+            return self._doc_index[1]
+        index = DocumentIndex()
+        texts = []
+        for page in pdf_doc:
+            text = self._page_cache.get(doc_key, page.number, clips)
+            if text is None:
+                text = extract_page_text(page, clips)
+            index.add_page(text)
+            texts.append(text)
+        self._doc_index = ((doc_key, clips), (index, texts))
+        return (index, texts)
+
+    def detect_style(self, filepath: str, max_pages: int = DETECT_PAGES):
+        '''
+        读取文档开头的一个泵（最多max_pages页），用各样式的匹配器前缀打分，
+        返回得分最高的(样式序号, 得分)，没有可用样式时返回None
+        '''
+        try:
+            self._detected = None
+            if len(self._pattern_f) == 0:
+                return None
+            pdf_doc = pymupdf.open(filepath)
+            doc_key = document_key(pdf_doc)
+            texts = []
+            started = False
+            for page in pdf_doc:
+                if len(texts) >= max_pages:
+                    break
+                # 整页提取一次，各样式共用
+                text = self._page_cache.load(doc_key, page)
+                is_start = any(m.is_segment_start(text) for m in self._pattern_f.values())
+                if is_start and started:
+                    # 已读到下一个泵
+                    break
+                started = started or is_start
+                texts.append(text)
+            pdf_doc.close()
+            best = None
+            for i, matcher in self._pattern_f.items():
+                value = matcher.score(texts)
+                if best is None or value > best[1]:
+                    best = (i, value)
+            self._detected = best
+            return best
+        except Exception:
+            traceback.print_exc()
+            return None
+
+    def iter_extract(self, filepath: str, pattern: int, use_index: bool = False, cancel=None,
+                     limits: ExtractLimits|None = None):
+        '''
+        逐页提取的生成器：每页处理后产出(ExtractEvent.Page, (页号, 总页数))，
+        每个泵在下一个第1页或文档结束时产出(ExtractEvent.Pump, MatchedArg)；
+        cancel为threading.Event等带is_set()的对象，置位后产出(ExtractEvent.Cancelled, 页号)并结束；
+        出错时产出(ExtractEvent.Error, 错误信息)。除写入词表缓存外，只保留当前泵的数据。
+        设置limits或样式配置了dedup时最后产出(ExtractEvent.Report, ExtractReport)，超出文档时间预算时提前结束
+        '''
+        pdf_doc = None
+        try:
+            if pattern == AUTO_STYLE:
+                detected = self.detect_style(filepath)
+                if detected is None:
+                    yield (ExtractEvent.Error, "无法识别样式")
+                    return
+                pattern = detected[0]
+            matcher = self._pattern_f.get(pattern)
+            if matcher is None:
+                yield (ExtractEvent.Error, "样式不存在")
+                return
+            # 之前的提取可能已积累足够的统计
+            matcher.refresh_priors()
+            clips = matcher.style.clips
+            bounded = limits is not None and limits.memory_mb is not None
+            store_key, stored = self.open_stored(filepath)
+            if bounded:
+                # 只保留当前泵的数据，不收集整份文档的文本
+                store_key = None
+            texts = []
+            if stored is not None:
+                # 命中词表缓存，不再做文本提取
+                index = stored if use_index else None
+                page_count = stored.page_count
+            else:
+                pdf_doc = pymupdf.open(filepath)
+                doc_key = document_key(pdf_doc)
+                page_count = pdf_doc.page_count
+                index = None
+                indexed = None
+                if use_index and not bounded:
+                    index, indexed = self.get_index(pdf_doc, doc_key, clips)
+                starts = self.cached_starts(doc_key, matcher)
+
+            report = ExtractReport()
+            started = time.monotonic()
+            result = []
+            for pno in range(page_count):
+                if cancel is not None and cancel.is_set():
+                    yield (ExtractEvent.Cancelled, pno)
+                    return
+                if limits is not None and limits.doc_seconds is not None and time.monotonic() - started > limits.doc_seconds:
+                    report.stopped_at = pno
+                    break
+                if stored is not None:
+                    text = None
+                    if not matcher.can_skip(pno, stored):
+                        text = stored.page_text(pno).set_clips(clips)
+                else:
+                    page = pdf_doc[pno]
+                    if indexed is not None:
+                        text = indexed[pno]
+                    else:
+                        text = self._page_cache.get(doc_key, pno, clips)
+                    # 需要整页文本写入词表缓存时不跳页
+                    if text is None and store_key is None and limits is not None and limits.skip_textless and is_textless(page):
+                        report.add_skipped(pno)
+                    elif text is None and (store_key is not None or not matcher.can_skip(pno, index, page, starts=starts)):
+                        if bounded:
+                            text = extract_page_text(page, clips)
+                        else:
+                            text = self._page_cache.load(doc_key, page, clips)
+                    if store_key is not None:
+                        texts.append(text)
+                    page = None
+                if text is not None:
+                    self.parse_limited(matcher, text, result, index, limits, report)
+                    report.add_removed(pno, matcher.last_removed)
+                    text = None
+                if bounded:
+                    self.relieve_memory(limits, report)
+                # 出现新的泵时，之前的泵已经完整
+                while len(result) > 1:
+                    yield (ExtractEvent.Pump, result.pop(0))
+                yield (ExtractEvent.Page, (pno, page_count))
+
+            for args in result:
+                yield (ExtractEvent.Pump, args)
+            if pdf_doc is not None:
+                pdf_doc.close()
+                pdf_doc = None
+            if report.stopped_at is None:
+                self.save_stored(store_key, stored, texts)
+            self.save_priors(pattern)
+            if limits is not None or matcher.style.dedup is not None:
+                report.peak_rss = peak_rss()
+                yield (ExtractEvent.Report, report)
+        except Exception:
+            traceback.print_exc()
+            yield (ExtractEvent.Error, "提取失败")
+        finally:
+            if pdf_doc is not None:
+                pdf_doc.close()
+
+    def parse_limited(self, matcher, text: PageText, result: list, index, limits: ExtractLimits|None, report: ExtractReport):
+        if limits is None:
+            matcher.parse(text, result, index)
+            return
+        if limits.max_words is not None and len(text.words) > limits.max_words:
+            # 只保留前max_words个词，索引位置与截断后的词表不再对应
+            cut = limits.max_words
+            text = PageText(text.number, text.words[0:cut], text.tokens[0:cut], False).set_clips(matcher.style.clips)
+            index = None
+            report.add_truncated(text.number)
+        deadline = None
+        if limits.page_seconds is not None:
+            deadline = time.monotonic() + limits.page_seconds
+        matcher.set_deadline(deadline)
+        matcher.parse(text, result, index)
+        matcher.set_deadline(None)
+        if matcher.timed_out:
+            report.add_truncated(text.number)
+
+    def extract_segment(self, pdf_doc: pymupdf.Document, doc_key, matcher, first: int, last: int):
+        '''提取以first页为第1页、到last页之前结束的一个泵'''
+        clips = matcher.style.clips
+        matcher.clear_queue()
+        result = []
+        for pno in range(first, last):
+            if pno > first and matcher.exhausted:
+                # 分段已知，匹配器完成后余下的页不会再有结果
+                break
+            matcher.parse(self._page_cache.load(doc_key, pdf_doc[pno], clips), result)
+        return result[0]
+
+    def extract_incremental(self, filepath: str, pattern: int):
+        '''
+        按页内容哈希分段，内容未变的泵直接复用上次的结果，返回(结果, 重新提取的泵序号列表)；
+        未配置分段缓存或样式不是从配置文件加载时，完整提取并视为全部变化
+        '''
         try:
             matcher = self._pattern_f.get(pattern)
             if matcher is None:
                 return None
+            matcher.refresh_priors()
+            if self._segment_cache is None or self._conf_key is None:
+                result = self.extract(filepath, pattern)
+                if result is None:
+                    return None
+                return (result, list(range(len(result))))
+
+            cache = self._segment_cache
+            style = matcher.style
+            header = dict(style.clips).get("header")
+            pdf_doc = pymupdf.open(filepath)
+            doc_key = document_key(pdf_doc)
+            hashes = [page_content_hash(page) for page in pdf_doc]
+            starts = []
+            for page, page_hash in zip(pdf_doc, hashes):
+                page_key = cache.start_key(style.page_num, header, style.dedup, page_hash)
+                is_start = cache.is_start(page_key)
+                if is_start is None:
+                    # 新的或修改过的页才需要提取文字
+                    is_start = matcher.is_segment_start(self._page_cache.load(doc_key, page, style.clips))
+                    cache.set_start(page_key, is_start)
+                if is_start:
+                    starts.append(page.number)
+            cache.flush()
+
+            # 与extract的结果缓存一样区分是否使用历史统计
+            style_key = f"{self._conf_key}-{pattern}-p{int(self._use_priors)}"
             result = []
+            changed = []
+            for n, first in enumerate(starts):
+                last = starts[n + 1] if n + 1 < len(starts) else pdf_doc.page_count
+                key = cache.segment_key(style_key, hashes[first:last])
+                args = cache.load(key)
+                if args is None:
+                    args = self.extract_segment(pdf_doc, doc_key, matcher, first, last)
+                    cache.save(key, args)
+                    changed.append(n)
+                result.append(args)
+            pdf_doc.close()
+            return (result, changed)
+        except Exception:
+            traceback.print_exc()
+            return None
+
+    def compare_styles(self, filepath: str, styles: list[CompiledStyle]):
+        '''
+        用多个样式（如新旧两版配置中的同一样式）提取同一文档，每页只提取一次文字，各样式共用词表和归一化词；
+        返回(各样式的结果列表, 第2个起各样式相对第1个样式的FieldDiff列表)，出错时返回None
+        '''
+        pdf_doc = None
+        try:
+            matchers = []
+            for style in styles:
+                matcher = base_matcher.BasicFileStyle()
+                matcher.load(style)
+                matchers.append(matcher)
+            results = [[] for _ in matchers]
             pdf_doc = pymupdf.open(filepath)
+            doc_key = document_key(pdf_doc)
             for page in pdf_doc:
-                matcher.parse(page, result)
+                todo = [i for i, matcher in enumerate(matchers) if not matcher.can_skip(page.number, page=page)]
+                if len(todo) == 0:
+                    continue
+                text = self._page_cache.load(doc_key, page)
+                # 区域配置相同的样式共用同一页面，索引也只建一次
+                views = {}
+                for i in todo:
+                    clips = matchers[i].style.clips
+                    view = views.get(clips)
+                    if view is None:
+                        view = text.with_clips(clips)
+                        views[clips] = view
+                    matchers[i].parse(view, results[i])
             pdf_doc.close()
+            pdf_doc = None
+            diffs = [diff_results(results[0], other) for other in results[1:]]
+            return (results, diffs)
+        except Exception:
+            traceback.print_exc()
+            return None
+        finally:
+            if pdf_doc is not None:
+                pdf_doc.close()
+
+    def compare_confs(self, filepath: str, files: list, pattern: int):
+        '''用多个配置文件中序号为pattern的样式提取同一文档，返回值同compare_styles'''
+        try:
+            styles = [self.compile_file(file)[1].styles[pattern] for file in files]
+        except Exception:
+            traceback.print_exc()
+            return None
+        return self.compare_styles(filepath, styles)
+
+    def extract(self, filepath: str, pattern: int, workers: int = 1, use_index: bool = False,
+                limits: ExtractLimits|None = None):
+        '''设置limits时串行提取，截断、跳过的页及去掉的重复词数见report'''
+        try:
+            self._report = None
+            if pattern == AUTO_STYLE:
+                detected = self.detect_style(filepath)
+                if detected is None:
+                    return None
+                pattern = detected[0]
+            matcher = self._pattern_f.get(pattern)
+            if matcher is None:
+                return None
+            cache_key = None
+            if self._result_cache is not None and self._conf_key is not None:
+                # 使用历史统计时结果可能不同，单独缓存
+                cache_key = self._result_cache.result_key(filepath, f"{self._conf_key}-{pattern}-p{int(self._use_priors)}")
+                result = self._result_cache.get(cache_key)
+                if result is not None:
+                    return result
+            if workers > 1 and limits is None:
+                pdf_doc = pymupdf.open(filepath)
+                page_count = pdf_doc.page_count
+                segments = self.cached_segments(document_key(pdf_doc), matcher)
+                pdf_doc.close()
+                result = extract_parallel(filepath, matcher.style, workers, page_count, segments)
+            else:
+                result = []
+                for event, payload in self.iter_extract(filepath, pattern, use_index, limits=limits):
+                    if event == ExtractEvent.Pump:
+                        result.append(payload)
+                    elif event == ExtractEvent.Report:
+                        self._report = payload
+                    elif event == ExtractEvent.Error:
+                        return None
+                if self._report is not None and not self._report.complete:
+                    # 不完整的结果不写入缓存
+                    cache_key = None
+            if cache_key is not None:
+                self._result_cache.put(cache_key, result)
             return result
         except Exception:
             traceback.print_exc() 
-            return None
\ No newline at end of file
+            return None
@@ -0,0 +1,43 @@
+from bisect import bisect_left
+
+from .page_text import PageText
+
+class DocumentIndex():
+    '''
+    文档级倒排索引：归一化词 -> [(页号, 词位置)]，另按原始词首字符索引供header型匹配器使用
+    '''
+    def __init__(self) -> None:
+        self._postings = {}
+        self._heads = {}
+        self._page_count = 0
+
+    @property
+    def page_count(self):
+        return self._page_count
+
+    def add_page(self, page: PageText):
+        number = page.number
+        for pos, token in enumerate(page.tokens):
+            self._postings.setdefault(token, []).append((number, pos))
+        for pos, word in enumerate(page.words):
+            text = word[4]
+            if len(text) > 0:
+                self._heads.setdefault(text[0], []).append((number, pos))
+        self._page_count = max(self._page_count, number + 1)
+
+    @staticmethod
+    def _page_slice(entries: list|None, page_no: int):
+        if entries is None:
+            return []
+        start = bisect_left(entries, (page_no, -1))
+        end = bisect_left(entries, (page_no + 1, -1))
+        return [pos for _, pos in entries[start:end]]
+
+    def positions(self, token: str, page_no: int):
+        return self._page_slice(self._postings.get(token), page_no)
+
+    def head_positions(self, char: str, page_no: int):
+        return self._page_slice(self._heads.get(char), page_no)
+
+    def has_token(self, token: str):
+        return token in self._postings
@@ -0,0 +1,89 @@
+from typing import NamedTuple
+import pymupdf
+
+class ExtractLimits(NamedTuple):
+    '''
+    提取的资源限制，None表示不限制
+    '''
+    # 整份文档的时间预算（秒），超出后停止并返回已得到的结果
+    doc_seconds: float | None = None
+    # 单页匹配的时间预算（秒），超出后放弃本页余下的位置
+    page_seconds: float | None = None
+    # 单页参与匹配的最大词数，超出部分丢弃
+    max_words: int | None = None
+    # 提取文字前跳过没有字体也没有文本对象的页
+    skip_textless: bool = True
+    # 内存预算（MB）：设置后不缓存页面文本，常驻内存超出预算时清空MuPDF的对象缓存
+    memory_mb: float | None = None
+
+class ExtractReport():
+    '''
+    一次提取或写回中被截断或跳过的页、各页去掉的重复词数及内存使用情况
+    '''
+    def __init__(self) -> None:
+        # 超出词数上限或单页时间预算的页
+        self._truncated = []
+        # 没有文字而跳过的页
+        self._skipped = []
+        # 超出文档时间预算时停在的页
+        self._stopped_at = None
+        # {页号: 去掉的重复词数}
+        self._removed = {}
+        # 峰值常驻内存（字节），及因超出内存预算清空MuPDF缓存的次数
+        self._peak_rss = None
+        self._shrinks = 0
+
+    @property
+    def truncated(self):
+        return self._truncated
+
+    @property
+    def skipped(self):
+        return self._skipped
+
+    @property
+    def stopped_at(self):
+        return self._stopped_at
+    @stopped_at.setter
+    def stopped_at(self, page_no: int):
+        self._stopped_at = page_no
+
+    def add_truncated(self, page_no: int):
+        if len(self._truncated) == 0 or self._truncated[-1] != page_no:
+            self._truncated.append(page_no)
+
+    @property
+    def peak_rss(self):
+        return self._peak_rss
+    @peak_rss.setter
+    def peak_rss(self, value: int|None):
+        self._peak_rss = value
+
+    @property
+    def shrinks(self):
+        return self._shrinks
+
+    def add_shrink(self):
+        self._shrinks += 1
+
+    @property
+    def removed(self):
+        return self._removed
+
+    def add_removed(self, page_no: int, count: int):
+        if count > 0:
+            self._removed[page_no] = count
+
+    def add_skipped(self, page_no: int):
+        self._skipped.append(page_no)
+
+    @property
+    def complete(self):
+        '''没有截断也没有提前停止，跳过的无文字页不影响结果'''
+        return len(self._truncated) == 0 and self._stopped_at is None
+
+def is_textless(page: pymupdf.Page):
+    '''不提取文字：页面不引用任何字体且内容流中没有文本对象时不可能有文字'''
+    if len(page.get_fonts(full=True)) > 0:
+        return False
+    return b"BT" not in page.read_contents()
@@ -1,22 +1,60 @@
+from bisect import bisect_right
+import time
 import pymupdf
-from pymupdf.utils import getColor
 import traceback
 
 from ..matched_arg import ArgEntry, MatchedArg, PumpInfoArg
 from ..const_def import SITE_CHAR
-from .basic import get_real_page_num_default, get_real_page_num_by_header, text_to_num, text_to_num_by_fac
+from ..page_text import PageText, extract_header_text
+from ..doc_index import DocumentIndex
+from ..matcher_priors import MatcherPriors
+from .basic import get_real_page_num_default, get_real_page_num_by_header, text_to_num, match_ids, WordCursor, TableContext, PAGE_NUM_ANCHORS
+from .token_trie import TokenTrie
+from .compiled_style import CompiledStyle, MatcherSpec, LocatorSpec, compile_style, compile_regex, matcher_anchor, prefix_anchor, GEOMETRY_TYPES
 
 class BasicFileStyle:
     def __init__(self) -> None:
+        self._style = None
         self._matchers = [[],[],[],[]]
         self._locators = []
+        # 匹配器与定位器的前缀树，来自编译后的样式
+        self._trie = TokenTrie()
+        self._loc_trie = TokenTrie()
+        # 匹配器在文档索引中的锚点
+        self._anchors = {}
+        # 正在搜索的页
+        self._page_text = None
 
         # 由于一个文件中会有多个泵，该表需要支持重置
         self._matcher_q = []
         # 用于定位写回数据的队列
         self._loc_q = []
-        self._section = None
+        # 当前所在段落，段落外的匹配器不参与匹配
+        self._context = TableContext()
+        self._section_of = {}
+        self._section_anchors = []
+        # 本页的段落切换点[(词位置, 段落)]，供整页匹配的regex型按位置判断段落
+        self._section_marks = []
+        # regex型和fuzzy型匹配器不参与逐词扫描
+        self._regex_keys = set()
+        self._fuzzy = {}
+        # regex型按配置顺序的MatcherSpec，及{待匹配键元组: (合并正则, 捕获组表)}
+        self._regex_specs = []
+        self._regex_cache = {}
         self._skip_step = 0
+        # 历史命中统计，use_priors为True时按命中率调整同一位置上匹配器的尝试顺序
+        self._priors = None
+        self._use_priors = False
+        # 调用方是否要求使用历史统计，统计足够时才实际使用
+        self._want_priors = False
+        self._rank = {}
+        # 当前页在泵内的页序，第1页为0
+        self._segment_page = 0
+        # 单页匹配的截止时间（time.monotonic），及本页是否因超时未扫描完
+        self._deadline = None
+        self._timed_out = False
+        # 最近一次parse去掉的重复词数
+        self._last_removed = 0
 
         self._font_size = None
         self._h_pos = None
@@ -25,68 +63,92 @@ class BasicFileStyle:
 
         self._page_num = None
 
-    def parse_arg(self, args: list):
-        result = []
-        for arg in args:
-            if isinstance(arg, list):
-                arg_set = set(arg)
-                result.append(arg_set)
-            else:
-                result.append(arg)
-        return result
+    def bind_matcher(self, spec: MatcherSpec|None):
+        if spec is None:
+            return None
 
-    def set_matcher(self, index: tuple, conf:dict|None):
-        if conf is None:
-            self._matchers[index[0]].append(None)
-            return
-        
-        if conf["type"] == "list":
-            post_arg = conf.get("post")
-            post_ls = []
-            if post_arg is not None:
-                post_ls = self.parse_arg(post_arg)
-            self._matchers[index[0]].append(
-                lambda row, args: self.match_list(self.parse_arg(conf["pre"]), post_ls, row, args, conf.get("to_join", 0), conf.get("skip", True))
-            )
-        elif conf["type"] == "change":
-            hd_c = conf["handler"]
-            hd = None
-            if hd_c["type"] == "factor":
-                hd = lambda x: text_to_num_by_fac(x, hd_c["arg"])
-            else:
-                raise NotImplementedError
-            self._matchers[index[0]].append(
-                lambda row, args: self.match_and_change(self.parse_arg(conf["pre"]), hd, row, args)
-            )
-        elif conf["type"] == "header":
-            self._matchers[index[0]].append(
-                lambda row, args: self.match_header_and_join(self.parse_arg(conf["pre"]), row, args, conf.get("to_join", 0), conf.get("skip", True))
-            )
+        if spec.kind == "list":
+            return lambda row, args: self.match_list(spec.pre_ids, spec.post_ids, row, args, spec.to_join, spec.skip)
+        elif spec.kind == "change":
+            fac = spec.handler[1]
+            hd = lambda x: x * fac
+            return lambda row, args: self.match_and_change(spec.pre_ids, hd, row, args)
+        elif spec.kind == "header":
+            return lambda row, args: self.match_header_and_join(spec.pre, row, args, spec.to_join, spec.skip)
+        elif spec.kind in GEOMETRY_TYPES:
+            return lambda row, args: self.match_geometry(spec.pre_ids, spec.kind, spec.max_dist, row, args, spec.skip)
+        elif spec.kind in ("regex", "fuzzy"):
+            # 由search_regex或search_fuzzy以取到的文本调用
+            return lambda text, args: self.set_text_value(text, args)
         else:
             raise NotImplementedError
 
-    def set_locator(self, index:int, conf:dict|None):
-        if conf is None:
-            self._locators.append(None)
-            return
+    def bind_locator(self, spec: LocatorSpec|None):
+        if spec is None:
+            return None
+
+        return lambda page, row, args: self.write_pos(spec.pre_ids, spec.offset, page, row, args, spec.skip, spec.is_cn, spec.dir)
+
+    @property
+    def style(self) -> CompiledStyle:
+        return self._style
 
-        self._locators.append(
-            lambda page, row, args: self.write_pos(self.parse_arg(conf["pre"]), conf["offset"], page, row, args, conf.get("skip", True), conf.get("is_cn", False), conf.get("dir", 0))
-        )
+    @property
+    def priors(self) -> MatcherPriors|None:
+        return self._priors
+
+    def set_priors(self, priors: MatcherPriors|None, use: bool = False):
+        self._priors = priors
+        self._want_priors = use
+        self.refresh_priors()
+
+    def refresh_priors(self):
+        '''按当前统计重新判断历史统计是否可用并重建命中率排序，每次提取开始时调用'''
+        priors = self._priors
+        self._use_priors = self._want_priors and priors is not None and priors.ready
+        self._rank = {}
+        if self._use_priors:
+            for group in self._style.matchers:
+                for spec in group:
+                    if spec is not None:
+                        self._rank[spec.index] = -priors.hit_rate(spec.index)
 
     def setup(self, conf: dict):
-        self._page_num = conf["page_num"]
-        ex_conf = conf["extract"]
-        for i, group in enumerate(ex_conf["matchers"]):
-            for j, matcher in enumerate(group):
-                self.set_matcher((i,j), matcher)
-        wb_conf = conf["writeback"]
-        for i, locator in enumerate(wb_conf["matchers"]):
-            self.set_locator(i, locator)
-        self._font_size = wb_conf["font_size"]
-        self._h_pos = wb_conf["h_pos"]
-        self._v_pos = wb_conf["v_pos"]
-        self._font_color = getColor(wb_conf["font_color"])
+        self.load(compile_style("", conf))
+
+    def load(self, style: CompiledStyle):
+        self._style = style
+        self._page_num = style.page_num
+        self._matchers = [[self.bind_matcher(spec) for spec in group] for group in style.matchers]
+        self._locators = [self.bind_locator(spec) for spec in style.locators]
+        self._trie = style.trie
+        self._loc_trie = style.loc_trie
+        self._anchors = {}
+        self._section_of = {}
+        self._regex_keys = set()
+        self._fuzzy = {}
+        self._regex_specs = []
+        self._regex_cache = {}
+        for group in style.matchers:
+            for spec in group:
+                if spec is not None:
+                    if spec.kind == "regex":
+                        self._regex_keys.add(spec.index)
+                        self._regex_specs.append(spec)
+                        if spec.section is not None:
+                            self._section_of[spec.index] = spec.section
+                        continue
+                    if spec.kind == "fuzzy":
+                        self._fuzzy[spec.index] = spec
+                        continue
+                    self._anchors[spec.index] = matcher_anchor(spec)
+                    if spec.section is not None:
+                        self._section_of[spec.index] = spec.section
+        self._section_anchors = [prefix_anchor(pre) for _, pre in style.sections]
+        self._font_size = style.font_size
+        self._h_pos = style.h_pos
+        self._v_pos = style.v_pos
+        self._font_color = style.font_color
 
     def _skip_cite(self, next_pos:int, words: list):
         if words[next_pos][4] in SITE_CHAR:
@@ -94,29 +156,21 @@ class BasicFileStyle:
             return next_pos + 1
         return next_pos
     
-    def write_pos(self, prefix: list, offset: int, page: pymupdf.Page, words: list, arg: ArgEntry, skip = True, china=False, dir=0):
+    def write_pos(self, prefix: list, offset: int, page: pymupdf.Page, words: WordCursor, arg: ArgEntry, skip = True, china=False, dir=0):
         #dir为方向，0为平行，1为垂直
         p_len = len(prefix)
         w_len = len(words)
         if p_len > w_len:
             return None
         
+        if not match_ids(prefix, words.ids, words.offset):
+            return None
+        # 以最后一个非None前缀词为定位基准
         word = None
         for i, to_check in enumerate(prefix):
-            if to_check is None:
-                continue
-            word = words[i]
-            text = word[4]
+            if to_check is not None:
+                word = words[i]
 
-            if text[-1] in SITE_CHAR:
-                text = text[0:-1]
-
-            if text != to_check:
-                return None
-            
-            if text == "吸入口":
-                pass
-        
         if word is None:
             return None
         ### pymupdf以topleft为起始点，word返回矩形的对角两点坐标，即依次为左，上，右，下
@@ -140,10 +194,11 @@ class BasicFileStyle:
 
         return 0
     
-    def match_header_and_join(self, prefix: list, words: list, arg: ArgEntry, to_join = 0, skip=True):
+    def match_header_and_join(self, prefix: list, words: WordCursor, arg: ArgEntry, to_join = 0, skip=True):
         p_len = len(prefix)
         w_len = len(words)
-        if p_len > w_len:
+        # 页面被截断时拼接的词可能不足
+        if p_len + to_join > w_len:
             return None
         
         text_len = 0
@@ -181,47 +236,19 @@ class BasicFileStyle:
         
         return 0
 
-    def match_list(self, prefix: list, postfix: list, words: list, arg: ArgEntry, to_join = 0, skip=True):
+    def match_list(self, prefix: list, postfix: list, words: WordCursor, arg: ArgEntry, to_join = 0, skip=True):
         p_len = len(prefix)
         post_len = len(postfix)
         w_len = len(words)
-        if p_len + post_len > w_len:
+        # 取值词、拼接的词及后缀都必须在页内，页面被截断时可能不足
+        if p_len + 1 + max(post_len, to_join) > w_len:
             return None
         
-        for i, to_check in enumerate(prefix):
-            if to_check is None:
-                continue
-            # information items will be found prefixed with their "key"
-            word = words[i]
-            text = word[4]
-            if text[-1] in SITE_CHAR:
-                text = text[0:-1]
-
-            if isinstance(to_check, set):
-                if text not in to_check:
-                    return None
-            else:
-                if text != to_check:
-                    return None
-        
-        for j, to_check_j in enumerate(postfix):
-            if to_check_j is None:
-                continue
-
-            word = words[p_len + 1 + j]
-            text = word[4]
-            if text[-1] in SITE_CHAR:
-                text = text[0:-1]
-
-            if len(text) == 0:
-                continue
-
-            if isinstance(to_check_j, set):
-                if text not in to_check_j:
-                    return None
-            else:
-                if text != to_check_j:
-                    return None
+        if not match_ids(prefix, words.ids, words.offset):
+            return None
+        # 后缀从取值词之后开始，归一化后为空的词不比较
+        if not match_ids(postfix, words.ids, words.offset + p_len + 1, True):
+            return None
 
         val_t = words[p_len][4]
         total = to_join
@@ -230,7 +257,10 @@ class BasicFileStyle:
             to_join -= 1
 
         if arg.unit is not None:
-            value = text_to_num(val_t)
+            if total == 0:
+                value = self.number_at(words.offset + p_len)
+            else:
+                value = text_to_num(val_t)
             if value is None:
                 return None
             arg.set_value(value)
@@ -242,39 +272,79 @@ class BasicFileStyle:
             return 1
         return 0
 
-    def match_and_change(self, prefix: list, handler, words: list, arg: ArgEntry):
+    def match_geometry(self, prefix: list, direction: str, max_dist: float, words: WordCursor, arg: ArgEntry, skip=True):
+        '''按词序匹配标签，取值为标签最后一个词右侧（right_of）或下方（below）最近的词'''
         p_len = len(prefix)
         w_len = len(words)
+        if p_len == 0 or p_len > w_len:
+            return None
 
-        if p_len > w_len:
+        if not match_ids(prefix, words.ids, words.offset):
             return None
 
-        for i, to_check in enumerate(prefix):
-            if to_check is None:
-                continue
-            # information items will be found prefixed with their "key"
-            word = words[i]
-            text = word[4]
-            if text[-1] in SITE_CHAR:
-                text = text[0:-1]
+        label = words.offset + p_len - 1
+        spatial = self._page_text.spatial
+        if direction == "right_of":
+            found = spatial.right_of(label, max_dist, SITE_CHAR)
+        else:
+            found = spatial.below(label, max_dist, SITE_CHAR)
+        if found is None:
+            return None
 
-            if isinstance(to_check, set):
-                if text not in to_check:
-                    return None
-            else:
-                if text != to_check:
-                    return None
-        
-        value = handler(words[p_len][4])
+        val_t = words.words[found][4]
+        if arg.unit is not None:
+            value = self.number_at(found)
+            if value is None:
+                return None
+            arg.set_value(value)
+        else:
+            arg.set_value(val_t)
+
+        if skip:
+            self._skip_step += p_len - 1
+            return 1
+        return 0
+
+    def number_at(self, index: int):
+        '''当前页第index个词的数值，不是数值时返回None'''
+        values, valid = self._page_text.numbers
+        if index >= len(valid) or not valid[index]:
+            return None
+        return values[index]
+
+    def set_text_value(self, val_t: str, arg: ArgEntry):
+        if arg.unit is not None:
+            value = text_to_num(val_t)
+            if value is None:
+                return None
+            arg.set_value(value)
+        else:
+            arg.set_value(val_t)
+        return 1
+
+    def match_and_change(self, prefix: list, handler, words: WordCursor, arg: ArgEntry):
+        p_len = len(prefix)
+        w_len = len(words)
+
+        if p_len + 1 > w_len:
+            return None
+
+        if not match_ids(prefix, words.ids, words.offset):
+            return None
+
+        value = self.number_at(words.offset + p_len)
         if value is None:
             return None
-        arg.set_value(value)
+        arg.set_value(handler(value))
         return 1
 
-    def reset_queue(self):
-        self._section = None
+    def clear_queue(self):
+        self._context.section = None
         self._matcher_q.clear()
         self._loc_q.clear()
+
+    def reset_queue(self):
+        self.clear_queue()
         for i, group in enumerate(self._matchers):
             for j, matcher in enumerate(group):
                 if matcher is not None:
@@ -284,40 +354,297 @@ class BasicFileStyle:
             if locator is not None:
                 self._loc_q.append((m, locator))
 
-    def search(self, words: list, args: MatchedArg):
+    def update_section(self, words: list, ids: list, pos: int):
+        '''pos处为段落标题时切换当前段落'''
+        found = self._style.section_trie.candidates(words, ids, pos)
+        if len(found) > 0:
+            self._context.section = self._style.sections[min(found)][0]
+            self._section_marks.append((pos, self._context.section))
+
+    def in_section(self, key: tuple):
+        section = self._section_of.get(key)
+        return section is None or section == self._context.section
+
+    def section_at(self, pos: int):
+        for mark, section in reversed(self._section_marks):
+            if mark <= pos:
+                return section
+        return None
+
+    def pending_regex(self, keys: list):
+        '''只含keys（按配置顺序）的合并正则，已完成的匹配器不再占用页面文本'''
+        keys = tuple(spec.index for spec in self._regex_specs if spec.index in keys)
+        found = self._regex_cache.get(keys)
+        if found is None:
+            found = compile_regex([spec for spec in self._regex_specs if spec.index in keys])
+            self._regex_cache[keys] = found
+        return found
+
+    def search_regex(self, page: PageText, args: MatchedArg):
+        '''
+        用待匹配键的合并正则扫描整页文本（各词以空格连接），按命中位置换算出词序号以判断段落；
+        命中被拒绝（段落不符、值无效或可选捕获组未参与匹配）时，在同一起点用其余表达式重试
+        '''
+        if self._style.regex is None:
+            return
+        pending = {item[0]: j for j, item in enumerate(self._matcher_q) if item[0] in self._regex_keys}
+        if len(pending) == 0:
+            return
+        starts = []
+        offset = 0
+        for word in page.words:
+            starts.append(offset)
+            offset += len(word[4]) + 1
+        text = " ".join(word[4] for word in page.words)
+
         to_pop = []
-        self._skip_step = 0
-        max_len = len(words)
-        for i, _ in enumerate(words):
-            if self._skip_step > 0:
-                self._skip_step -= 1
+        # 在当前起点pos被拒绝的键，从下一个位置起仍可命中
+        pos = 0
+        rejected = set()
+        while len(pending) > 0 and pos <= len(text):
+            found = None
+            others = [key for key in pending if key not in rejected]
+            if len(others) > 0:
+                regex, groups = self.pending_regex(others)
+                found = regex.search(text, pos)
+            if len(rejected) > 0:
+                regex, retry_groups = self.pending_regex(list(pending))
+                retry = regex.search(text, pos + 1)
+                if retry is not None and (found is None or retry.start() <= found.start()):
+                    found, groups = retry, retry_groups
+            if found is None:
+                break
+            if found.start() > pos:
+                pos = found.start()
+                rejected.clear()
+            key, group = groups[found.lastindex]
+            j = pending[key]
+            value = found.group(group)
+            word_pos = bisect_right(starts, found.start(group)) - 1
+            section = self._section_of.get(key)
+            if value is None or (section is not None and section != self.section_at(word_pos)) \
+                    or self._matcher_q[j][1](value, args.get_arg(key[0], key[1])) is None:
+                rejected.add(key)
                 continue
-            if i > max_len - 1:
+            del pending[key]
+            to_pop.append(j)
+            args.add_found(key)
+            if self._priors is not None:
+                self._priors.record(key, self._segment_page, word_pos)
+            pos = max(found.end(), found.start() + 1)
+            rejected.clear()
+
+        to_pop.sort(reverse=True)
+        for m in to_pop:
+            self._matcher_q.pop(m)
+
+    def search_fuzzy(self, page: PageText, args: MatchedArg):
+        '''
+        在页面的二元组索引中查找与标签相近的连续词，取其后的词为值，同一标签取最靠前的命中
+        '''
+        pending = [(j, self._fuzzy[item[0]]) for j, item in enumerate(self._matcher_q) if item[0] in self._fuzzy]
+        if len(pending) == 0:
+            return
+        words = page.words
+        to_pop = []
+        for j, spec in pending:
+            key = spec.index
+            arg = args.get_arg(key[0], key[1])
+            section = self._section_of.get(key)
+            for start, end, _ in page.grams.find(spec.pre[0], spec.max_dist):
+                if end + 1 + spec.to_join >= len(words):
+                    continue
+                if section is not None and section != self.section_at(start):
+                    continue
+                val_t = "".join(word[4] for word in words[end + 1:end + 2 + spec.to_join])
+                if self._matcher_q[j][1](val_t, arg) is None:
+                    continue
+                to_pop.append(j)
+                args.add_found(key)
+                if self._priors is not None:
+                    self._priors.record(key, self._segment_page, start)
+                break
+
+        to_pop.sort(reverse=True)
+        for m in to_pop:
+            self._matcher_q.pop(m)
+
+    def search(self, page: PageText, args: MatchedArg, positions=None):
+        '''
+        positions为可能命中的起始位置（升序），为None时扫描整页
+        '''
+        to_pop = []
+        words = page.words
+        ids = page.token_ids(self._style.vocab)
+        cursor = WordCursor(words, ids=ids)
+        # 位置型匹配器通过当前页的网格索引取值
+        self._page_text = page
+        has_sections = len(self._section_anchors) > 0
+        # 本页开始时仍待匹配的匹配器及其在队列中的顺序
+        pending = {matcher[0]: j for j, matcher in enumerate(self._matcher_q)}
+        if positions is None:
+            positions = range(len(words))
+        next_pos = 0
+        for n, i in enumerate(positions):
+            if self._deadline is not None and n & 0xFF == 0 and time.monotonic() > self._deadline:
+                # 超出单页时间预算，放弃余下的位置
+                self._timed_out = True
+                break
+            if has_sections:
+                self.update_section(words, ids, i)
+            if i < next_pos:
                 continue
-            for j, matcher in enumerate(self._matcher_q):
+            self._skip_step = 0
+            found = self._trie.candidates(words, ids, i)
+            order = sorted(pending[key] for key in found if key in pending and self.in_section(key))
+            if self._use_priors:
+                # 历史命中率高的先尝试
+                order.sort(key=lambda j: self._rank.get(self._matcher_q[j][0], 0))
+            for j in order:
+                matcher = self._matcher_q[j]
                 arg = args.get_arg(matcher[0][0], matcher[0][1])
-                result = matcher[1](words[i:], arg)
+                result = matcher[1](cursor.seek(i), arg)
                 if result is not None:
                     to_pop.append(j)
                     args.add_found((matcher[0][0], matcher[0][1]))
+                    if self._priors is not None:
+                        self._priors.record(matcher[0], self._segment_page, i)
                     if result > 0:
                         # 当前位置只有一个匹配
                         break
+            next_pos = i + 1 + self._skip_step
 
         to_pop.sort(reverse=True)
         for m in to_pop:
             self._matcher_q.pop(m)
 
-    def parse_page(self, page: pymupdf.Page):
+    def anchor_positions(self, index: DocumentIndex, page_no: int):
+        '''
+        根据文档索引返回本页待匹配项可能命中的起始位置，存在无法索引的匹配器时返回None
+        '''
+        positions = set()
+        for key, _ in self._matcher_q:
+            if key in self._regex_keys or key in self._fuzzy:
+                continue
+            anchor = self._anchors.get(key)
+            if anchor is None:
+                return None
+            offset, kind, value = anchor
+            if kind == "head":
+                hits = index.head_positions(value, page_no)
+            else:
+                hits = []
+                for token in value:
+                    hits.extend(index.positions(token, page_no))
+            for pos in hits:
+                if pos >= offset:
+                    positions.add(pos - offset)
+        for anchor in self._section_anchors:
+            if anchor is None:
+                return None
+            offset, _, value = anchor
+            for token in value:
+                for pos in index.positions(token, page_no):
+                    if pos >= offset:
+                        positions.add(pos - offset)
+        return sorted(positions)
+
+    def parse_page(self, page: PageText):
+        words = page.for_role("header").words
         if self._page_num == "default":
-            return get_real_page_num_default(page)
+            return get_real_page_num_default(words)
         elif self._page_num == "header":
-            return get_real_page_num_by_header(page)
+            return get_real_page_num_by_header(words)
         else:
             raise NotImplementedError
 
-    def parse(self, page: pymupdf.Page, result: list):
+    @property
+    def last_removed(self):
+        return self._last_removed
+
+    def prepare(self, page: PageText):
+        '''样式配置了dedup时去掉重叠的重复词'''
+        if self._style.dedup is None:
+            return page
+        return page.deduped(self._style.dedup)
+
+    @property
+    def timed_out(self):
+        return self._timed_out
+
+    def set_deadline(self, deadline: float|None):
+        self._deadline = deadline
+
+    @property
+    def exhausted(self):
+        '''当前泵的匹配器已全部完成'''
+        return len(self._matcher_q) == 0
+
+    def is_segment_start(self, page: PageText):
+        try:
+            return self.parse_page(self.prepare(page)) == 1
+        except Exception:
+            # 页码识别出错的页在parse中同样不会开始新的泵
+            return False
+
+    def may_start_segment(self, index: DocumentIndex, page_no: int):
+        '''根据文档索引判断本页是否可能是第1页，只排除一定不是的页'''
+        anchor = PAGE_NUM_ANCHORS.get(self._page_num)
+        if anchor is None:
+            return True
+        kind, value = anchor
+        if kind == "head":
+            return len(index.head_positions(value, page_no)) > 0
+        return len(index.positions(value, page_no)) > 0
+
+    def score(self, texts: list[PageText]):
+        '''
+        样式与给定页面的吻合程度：前缀在页面上出现过的匹配器所占比例，
+        各页都识别不出第1页时减半；无法建立索引的匹配器不计入
+        '''
+        keys = {key for key, anchor in self._anchors.items() if anchor is not None}
+        if len(keys) == 0:
+            return 0.0
+        seen = set()
+        started = False
+        for text in texts:
+            started = started or self.is_segment_start(text)
+            words = text.words
+            ids = text.token_ids(self._style.vocab)
+            for i in range(len(words)):
+                seen.update(self._trie.candidates(words, ids, i))
+        value = len(seen & keys) / len(keys)
+        if not started:
+            value /= 2
+        return value
+
+    def can_skip(self, page_no: int, index: DocumentIndex|None = None, page: pymupdf.Page|None = None, writeback: bool = False,
+                 starts: set|None = None):
+        '''
+        当前泵的匹配器（写回时为定位器）已全部完成时，下一个第1页之前的页不会产生任何结果。
+        有分段表时直接按各泵起始页starts判断，否则用文档索引或只提取页码区域的低成本探测，无法判断时返回False
+        '''
+        queue = self._loc_q if writeback else self._matcher_q
+        if len(queue) > 0:
+            return False
+        if starts is not None:
+            return page_no not in starts
+        if index is not None and not self.may_start_segment(index, page_no):
+            return True
+        if page is not None:
+            for role, rect in self._style.clips:
+                if role == "header":
+                    return not self.is_segment_start(extract_header_text(page, rect))
+        return False
+
+    def parse(self, page: PageText, result: list, index: DocumentIndex|None = None):
         try:
+            prepared = self.prepare(page)
+            self._last_removed = len(page.words) - len(prepared.words)
+            if prepared is not page:
+                # 索引中的位置对应去重前的词表
+                index = None
+                page = prepared
             args = None
             if len(result) > 0:
                 args = result[-1]
@@ -326,31 +653,54 @@ class BasicFileStyle:
                 args = MatchedArg()
                 result.append(args)
                 self.reset_queue()
+                self._segment_page = 0
+                if self._priors is not None:
+                    self._priors.start_segment()
                 if self._page_num == "default":
                     #该格式跳过第一页
                     return None
-                
+            else:
+                self._segment_page += 1
+
             if len(self._matcher_q) == 0:
                 return None
-            words = page.get_text("words", sort=False)
-            self.search(words, args)
+            data = page.for_role("data")
+            self._timed_out = False
+            self._section_marks = [(-1, self._context.section)]
+            positions = None
+            # 索引中的位置对应整页词表，限定数据区域时不能使用
+            if index is not None and data is page:
+                positions = self.anchor_positions(index, page.number)
+            if positions is None or len(positions) > 0:
+                self.search(data, args, positions)
+            if self._timed_out:
+                return result
+            # 逐词扫描之后再整页匹配正则和近似标签
+            self.search_regex(data, args)
+            self.search_fuzzy(data, args)
             return result
         except Exception:
             traceback.print_exc() 
             return None
     
-    def locate(self, page: pymupdf.Page, words: list, args: PumpInfoArg):
+    def locate(self, page: pymupdf.Page, text: PageText, args: PumpInfoArg):
         found = []
         self._skip_step = 0
+        words = text.words
+        ids = text.token_ids(self._style.vocab)
+        cursor = WordCursor(words, ids=ids)
+        pending = {locator[0]: j for j, locator in enumerate(self._loc_q)}
         for i, _ in enumerate(words):
             if self._skip_step > 0:
                 self._skip_step -= 1
                 continue
-            for j, locator in enumerate(self._loc_q):
+            candidates = self._loc_trie.candidates(words, ids, i)
+            for j in sorted(pending[key] for key in candidates if key in pending):
+                locator = self._loc_q[j]
                 arg = args.get_arg(locator[0])
                 if arg.value is None:
                     continue
-                result = locator[1](page, words[i:], arg)
+                result = locator[1](page, cursor.seek(i), arg)
                 if result is not None:
                     found.append(j)
                     args.writen_args.append(locator[0])
@@ -361,12 +711,13 @@ class BasicFileStyle:
         for j in found:
             self._loc_q.pop(j)
         
-    def writeback(self, page: pymupdf.Page, result: list[PumpInfoArg]):
+    def writeback(self, page: pymupdf.Page, text: PageText, result: list[PumpInfoArg]):
         try:
+            text = self.prepare(text)
             args = None
             if len(result) == 0:
                 return "无可写回数据"
-            page_no = self.parse_page(page)
+            page_no = self.parse_page(text)
             if page_no == 1:
                 args = result.pop()
                 result.insert(0, args)
@@ -378,8 +729,7 @@ class BasicFileStyle:
                 args = result[0]
             if len(self._loc_q) == 0:
                 return None
-            words = page.get_text("words", sort=False)
-            self.locate(page, words, args)
+            self.locate(page, text.for_role("writeback"), args)
             return result
         except Exception:
             traceback.print_exc() 
@@ -1,17 +1,50 @@
-import pymupdf
+import re
+from array import array
 
-def text_to_num(src: str):
-    if not src.replace(".", "1").isdigit():
+from .token_trie import TokenVocab, fold_token
+
+# 数值：可带正负号、千位分隔符和小数部分；"a~b"形式的范围取哪个值尚未确定，不作为数值
+NUMBER_RE = re.compile(r"[+-]?(?:[0-9]{1,3}(?:,[0-9]{3})+|[0-9]*)(?:\.[0-9]*)?")
+# 可能是数值的词的首字符，其余的词不做解析
+NUMBER_START = frozenset("0123456789+-.０１２３４５６７８９")
+
+def _to_float(text: str):
+    if not any("0" <= ch <= "9" for ch in text):
         return None
-    return float(src)
+    return float(text.replace(",", ""))
 
-def text_to_num_by_fac(src: str,  fac: float):
-    if not src.replace(".", "1").isdigit():
+def text_to_num(src: str):
+    text = fold_token(src)
+    if NUMBER_RE.fullmatch(text) is None:
         return None
-    return float(src) * fac
+    return _to_float(text)
 
-def get_real_page_num_default(page: pymupdf.Page):
-    words = page.get_text("words", sort=False)
+def parse_numbers(words: list):
+    '''
+    逐词解析数值，返回(array('d')数值, bytearray有效标记)，与words一一对应
+    '''
+    values = array("d", bytes(8 * len(words)))
+    valid = bytearray(len(words))
+    for i, word in enumerate(words):
+        text = word[4]
+        if len(text) == 0 or text[0] not in NUMBER_START:
+            continue
+        value = text_to_num(text)
+        if value is not None:
+            values[i] = value
+            valid[i] = 1
+    return (values, valid)
+
+def leading_int(text: str):
+    '''文本开头连续数字组成的整数，全角数字按半角处理，没有数字时抛出ValueError'''
+    digits = ""
+    for ch in fold_token(text):
+        if not "0" <= ch <= "9":
+            break
+        digits += ch
+    return int(digits)
+
+def get_real_page_num_default(words: list):
     for i, word in enumerate(words):
         text = word[4]
         if text == "第":
@@ -20,18 +53,77 @@ def get_real_page_num_default(page: pymupdf.Page):
                 return int(words[i+1][4])
     return None
 
-def get_real_page_num_by_header(page: pymupdf.Page):
-    words = page.get_text("words", sort=False)
+def get_real_page_num_by_header(words: list):
     for i, word in enumerate(words):
         text = word[4]
         if text[0:2] == "页码":
             if text[2] in {"：", ":"}:
+                # 页码可能是多位数，如“页码：12”
                 if len(text) > 3:
-                    return int(text[3])
+                    return leading_int(text[3:])
                 else:
-                    return int(words[i+1][4][0])
+                    return leading_int(words[i+1][4])
     return None
 
+def match_ids(checks: tuple, ids: list, start: int, skip_empty: bool = False):
+    '''
+    ids[start + i]逐项在checks[i]的可选编号集合内，None为任意词；
+    skip_empty时归一化后为空的词不参与比较
+    '''
+    for i, allowed in enumerate(checks):
+        if allowed is None:
+            continue
+        token_id = ids[start + i]
+        if skip_empty and token_id == TokenVocab.EMPTY:
+            continue
+        if token_id not in allowed:
+            return False
+    return True
+
+# 各页码格式中第1页必然包含的词：("token", 归一化词)或("head", 词首字符)
+PAGE_NUM_ANCHORS = {
+    "default": ("token", "第"),
+    "header": ("head", "页"),
+}
+
+class WordCursor():
+    '''
+    words[offset:]的只读视图，匹配器按相对下标访问，移动位置时不复制词表
+    '''
+    __slots__ = ("_words", "_offset", "_ids")
+
+    def __init__(self, words: list, offset: int = 0, ids: list|None = None) -> None:
+        self._words = words
+        self._offset = offset
+        # 与words一一对应的词编号
+        self._ids = ids
+
+    @property
+    def words(self):
+        return self._words
+
+    @property
+    def ids(self):
+        return self._ids
+
+    @property
+    def offset(self):
+        return self._offset
+
+    def seek(self, offset: int):
+        self._offset = offset
+        return self
+
+    def __len__(self):
+        return len(self._words) - self._offset
+
+    def __getitem__(self, index: int):
+        if index < 0:
+            index += len(self)
+            if index < 0:
+                raise IndexError("cursor index out of range")
+        return self._words[self._offset + index]
+
 class TableContext():
     def __init__(self) -> None:
         self._section = None
@@ -0,0 +1,280 @@
+import re
+from typing import NamedTuple
+from pymupdf.utils import getColor
+
+from .token_trie import TokenTrie, TokenVocab, fold_token, normalize_token
+from ..page_text import CLIP_ROLES
+from ..fuzzy_index import max_label_dist
+
+# 按位置查找取值的匹配器类型
+GEOMETRY_TYPES = ("right_of", "below")
+DEFAULT_MAX_DIST = 200
+# fuzzy型默认允许的编辑距离，不超过标签长度允许的上限
+DEFAULT_FUZZY_DIST = 1
+# 重复词去重的默认坐标容差
+DEFAULT_DEDUP_TOL = 1.0
+
+class MatcherSpec(NamedTuple):
+    index: tuple
+    kind: str
+    pre: tuple
+    post: tuple = ()
+    to_join: int = 0
+    skip: bool = True
+    # ("factor", 系数)
+    handler: tuple | None = None
+    # 所属段落，None表示不限段落
+    section: str | None = None
+    # 位置型匹配器的最大查找距离，fuzzy型为允许的编辑距离
+    max_dist: float | None = None
+    # pre/post按样式词表编码，各项为可选编号集合或None
+    pre_ids: tuple = ()
+    post_ids: tuple = ()
+    # regex型的正则表达式，有捕获组时取第一个捕获组为值
+    pattern: str | None = None
+
+class LocatorSpec(NamedTuple):
+    index: int
+    pre: tuple
+    offset: float
+    skip: bool = True
+    is_cn: bool = False
+    dir: int = 0
+    pre_ids: tuple = ()
+
+class CompiledStyle(NamedTuple):
+    '''
+    解析并编译完成的样式，只读，可序列化到缓存文件
+    '''
+    name: str
+    page_num: str
+    # 按参数组排列，未配置的位置为None
+    matchers: tuple
+    locators: tuple
+    trie: TokenTrie
+    loc_trie: TokenTrie
+    font_size: float
+    h_pos: float
+    v_pos: float
+    font_color: tuple
+    # ((段落名, 段落标题前缀), ...)，标题前缀按段落序号编入section_trie
+    sections: tuple = ()
+    section_trie: TokenTrie | None = None
+    # ((用途, (x0, y0, x1, y1)), ...)，用途见page_text.CLIP_ROLES
+    clips: tuple = ()
+    # 各前缀树按此词表的编号建立
+    vocab: TokenVocab | None = None
+    # 所有regex型匹配器合并成的正则，及{外层捕获组序号: (匹配器键, 取值捕获组序号)}
+    regex: re.Pattern | None = None
+    regex_groups: dict | None = None
+    # 重复词去重的坐标容差，None为不去重
+    dedup: float | None = None
+
+class CompiledConfig(NamedTuple):
+    pump_setting: tuple
+    styles: tuple
+
+    @property
+    def display_list(self):
+        return [style.name for style in self.styles]
+
+def freeze_arg(args: list | None, normalize: bool = True):
+    '''
+    列表项转为可选项集合，整体转为元组；normalize时去掉空白并转换全角数字，
+    末尾的冒号保留原样，与以往一样不会匹配页面上的词
+    '''
+    if args is None:
+        return ()
+    result = []
+    for arg in args:
+        if isinstance(arg, list):
+            result.append(frozenset(fold_token(alt) if normalize else alt for alt in arg))
+        elif isinstance(arg, str) and normalize:
+            result.append(fold_token(arg))
+        else:
+            result.append(arg)
+    return tuple(result)
+
+def compile_matcher(index: tuple, conf: dict | None):
+    if conf is None:
+        return None
+
+    spec = _compile_matcher(index, conf)
+    section = conf.get("section")
+    if section is not None:
+        spec = spec._replace(section=section)
+    return spec
+
+def _compile_matcher(index: tuple, conf: dict):
+    if conf["type"] == "list":
+        return MatcherSpec(index, "list", freeze_arg(conf["pre"]), freeze_arg(conf.get("post")),
+                           conf.get("to_join", 0), conf.get("skip", True))
+    elif conf["type"] == "change":
+        hd_c = conf["handler"]
+        if hd_c["type"] != "factor":
+            raise NotImplementedError
+        return MatcherSpec(index, "change", freeze_arg(conf["pre"]), handler=("factor", hd_c["arg"]))
+    elif conf["type"] == "header":
+        # header型按原文做前缀比较，不归一化
+        return MatcherSpec(index, "header", freeze_arg(conf["pre"], False), to_join=conf.get("to_join", 0),
+                           skip=conf.get("skip", True))
+    elif conf["type"] in GEOMETRY_TYPES:
+        return MatcherSpec(index, conf["type"], freeze_arg(conf["pre"]), skip=conf.get("skip", True),
+                           max_dist=conf.get("max_dist", DEFAULT_MAX_DIST))
+    elif conf["type"] == "fuzzy":
+        # pre各项首尾相接作为一个标签，与页面上连续词的文本比较
+        label = normalize_token("".join(conf["pre"]))
+        max_dist = min(conf.get("max_dist", DEFAULT_FUZZY_DIST), max_label_dist(label))
+        return MatcherSpec(index, "fuzzy", (label,), to_join=conf.get("to_join", 0), max_dist=max_dist)
+    elif conf["type"] == "regex":
+        check_regex_pattern(index, conf["pattern"])
+        return MatcherSpec(index, "regex", (), pattern=conf["pattern"])
+    else:
+        raise NotImplementedError
+
+class StyleConfigError(Exception):
+    '''样式配置无法编译，消息可直接显示给用户'''
+    pass
+
+def check_regex_pattern(index: tuple, pattern: str):
+    '''
+    regex型的表达式会包在外层捕获组中与其他匹配器合并，组号随之改变，
+    因此不支持命名组、编号反向引用和条件引用
+    '''
+    try:
+        compiled = re.compile(pattern)
+    except re.error as e:
+        raise StyleConfigError(f"匹配器{index}的正则表达式无效：{pattern}（{e}）")
+    if len(compiled.groupindex) > 0:
+        raise StyleConfigError(f"匹配器{index}的正则表达式不支持命名组(?P<...>)：{pattern}")
+    i = 0
+    in_class = False
+    while i < len(pattern):
+        ch = pattern[i]
+        if ch == "\\":
+            if not in_class and i + 1 < len(pattern) and pattern[i + 1] in "123456789":
+                raise StyleConfigError(f"匹配器{index}的正则表达式不支持反向引用\\{pattern[i + 1]}：{pattern}")
+            i += 2
+            continue
+        if in_class:
+            if ch == "]":
+                in_class = False
+        elif ch == "[":
+            in_class = True
+            # 紧跟在[或[^之后的]是普通字符
+            if pattern.startswith("^", i + 1):
+                i += 1
+            if pattern.startswith("]", i + 1):
+                i += 1
+        elif pattern.startswith("(?(", i):
+            raise StyleConfigError(f"匹配器{index}的正则表达式不支持条件引用(?(...))：{pattern}")
+        i += 1
+
+def compile_regex(specs: list):
+    '''
+    合并为一个分支正则，每个匹配器的表达式包在以其键命名的捕获组中，按配置顺序排列；
+    同一起点多个分支都能匹配时取排在前面的
+    '''
+    if len(specs) == 0:
+        return None, None
+    parts = [f"(?P<m{spec.index[0]}_{spec.index[1]}>{spec.pattern})" for spec in specs]
+    regex = re.compile("|".join(parts))
+    groups = {}
+    for spec in specs:
+        outer = regex.groupindex[f"m{spec.index[0]}_{spec.index[1]}"]
+        inner = re.compile(spec.pattern).groups
+        groups[outer] = (spec.index, outer + 1 if inner > 0 else outer)
+    return regex, groups
+
+def matcher_anchor(spec: MatcherSpec):
+    return prefix_anchor(spec.pre, spec.kind == "header")
+
+def prefix_anchor(prefix: tuple, is_header: bool = False):
+    '''
+    返回(前缀位置, 类型, 值)：类型为token时值为可选词集合，为head时值为词首字符；
+    前缀全为None等无法建立索引的情况返回None
+    '''
+    for i, to_check in enumerate(prefix):
+        if to_check is None:
+            continue
+        if is_header:
+            if isinstance(to_check, str) and len(to_check) > 0:
+                return (i, "head", to_check[0])
+            return None
+        if isinstance(to_check, frozenset):
+            return (i, "token", to_check)
+        return (i, "token", frozenset((to_check,)))
+    return None
+
+def compile_locator(index: int, conf: dict | None):
+    if conf is None:
+        return None
+    return LocatorSpec(index, freeze_arg(conf["pre"]), conf["offset"], conf.get("skip", True),
+                       conf.get("is_cn", False), conf.get("dir", 0))
+
+def compile_dedup(dedup):
+    '''dedup配置：true为默认容差，false或未配置为不去重，数值为坐标容差且必须大于0'''
+    if dedup is None or dedup is False:
+        return None
+    if dedup is True:
+        return DEFAULT_DEDUP_TOL
+    if not isinstance(dedup, (int, float)) or dedup <= 0:
+        raise StyleConfigError(f"dedup必须为true、false或大于0的坐标容差：{dedup}")
+    return float(dedup)
+
+def compile_style(name: str, conf: dict):
+    vocab = TokenVocab()
+    trie = TokenTrie()
+    matchers = []
+    regex_specs = []
+    for i, group in enumerate(conf["extract"]["matchers"]):
+        specs = []
+        for j, matcher in enumerate(group):
+            spec = compile_matcher((i, j), matcher)
+            if spec is not None:
+                if spec.kind == "header":
+                    trie.add_header(spec.index, spec.pre)
+                elif spec.kind == "regex":
+                    # 不参与逐词扫描，整页文本匹配一次
+                    regex_specs.append(spec)
+                # fuzzy型通过页面的二元组索引查找，不加入前缀树
+                elif spec.kind != "fuzzy":
+                    spec = spec._replace(pre_ids=vocab.freeze(spec.pre), post_ids=vocab.freeze(spec.post))
+                    trie.add_sequence(spec.index, spec.pre_ids)
+            specs.append(spec)
+        matchers.append(tuple(specs))
+
+    wb_conf = conf["writeback"]
+    loc_trie = TokenTrie()
+    locators = []
+    for i, locator in enumerate(wb_conf["matchers"]):
+        spec = compile_locator(i, locator)
+        if spec is not None:
+            spec = spec._replace(pre_ids=vocab.freeze(spec.pre))
+            loc_trie.add_sequence(spec.index, spec.pre_ids)
+        locators.append(spec)
+
+    section_trie = TokenTrie()
+    sections = []
+    for i, section in enumerate(conf.get("sections", [])):
+        pre = freeze_arg(section["pre"])
+        section_trie.add_sequence(i, vocab.freeze(pre))
+        sections.append((section["name"], pre))
+
+    regex, regex_groups = compile_regex(regex_specs)
+
+    dedup = compile_dedup(conf.get("dedup"))
+
+    clip_conf = conf.get("clip", {})
+    clips = tuple((role, tuple(clip_conf[role])) for role in CLIP_ROLES if role in clip_conf)
+
+    return CompiledStyle(name=name, page_num=conf["page_num"], matchers=tuple(matchers), locators=tuple(locators),
+                         trie=trie, loc_trie=loc_trie, font_size=wb_conf["font_size"], h_pos=wb_conf["h_pos"],
+                         v_pos=wb_conf["v_pos"], font_color=getColor(wb_conf["font_color"]),
+                         sections=tuple(sections), section_trie=section_trie, clips=clips,
+                         vocab=vocab, regex=regex, regex_groups=regex_groups, dedup=dedup)
+
+def compile_config(conf: dict):
+    pump_setting = (("flow_gap", conf["pump"]["flow_gap"]), ("lift_gap", conf["pump"]["lift_gap"]))
+    styles = tuple(compile_style(style["name"], style["settings"]) for style in conf["styles"])
+    return CompiledConfig(pump_setting, styles)
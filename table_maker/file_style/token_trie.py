@@ -0,0 +1,164 @@
+from ..const_def import SITE_CHAR
+
+_FULL_WIDTH_DIGITS = str.maketrans("０１２３４５６７８９", "0123456789")
+
+def fold_token(text: str):
+    # 去掉空白（含全角空格），全角数字转为半角
+    return "".join(text.split()).translate(_FULL_WIDTH_DIGITS)
+
+def normalize_token(text: str):
+    # 页面上的词再去掉末尾的冒号，与匹配器的比较规则一致
+    text = fold_token(text)
+    if len(text) > 0 and text[-1] in SITE_CHAR:
+        return text[0:-1]
+    return text
+
+class TokenVocab():
+    '''
+    样式中出现的归一化词到整数编号的对应表，随编译后的样式保存；
+    页面上不在表中的词编号为UNKNOWN，不会与任何前缀相等
+    '''
+    UNKNOWN = -1
+    EMPTY = 0
+
+    def __init__(self) -> None:
+        self._ids = {"": TokenVocab.EMPTY}
+
+    def __len__(self):
+        return len(self._ids)
+
+    def add(self, token: str):
+        found = self._ids.get(token)
+        if found is None:
+            found = len(self._ids)
+            self._ids[token] = found
+        return found
+
+    def get(self, token: str):
+        return self._ids.get(token, TokenVocab.UNKNOWN)
+
+    def encode(self, tokens: list):
+        get = self._ids.get
+        unknown = TokenVocab.UNKNOWN
+        return [get(token, unknown) for token in tokens]
+
+    def freeze(self, prefix: tuple):
+        '''前缀各项转为可选编号集合，None保持为任意词'''
+        result = []
+        for to_check in prefix:
+            if to_check is None:
+                result.append(None)
+            elif isinstance(to_check, frozenset):
+                result.append(frozenset(self.add(alt) for alt in to_check))
+            else:
+                result.append(frozenset((self.add(to_check),)))
+        return tuple(result)
+
+class _TrieNode():
+    __slots__ = ("edges", "wild", "keys")
+
+    def __init__(self) -> None:
+        self.edges = {}
+        # None 表示任意词
+        self.wild = None
+        self.keys = []
+
+    def child(self, token: str):
+        node = self.edges.get(token)
+        if node is None:
+            node = _TrieNode()
+            self.edges[token] = node
+        return node
+
+    def wild_child(self):
+        if self.wild is None:
+            self.wild = _TrieNode()
+        return self.wild
+
+class TokenTrie():
+    '''
+    将所有匹配器的前缀序列编译为一棵词前缀树，每个位置只需沿树走一次即可得到候选匹配器，
+    候选匹配器仍需调用原匹配函数做完整校验
+    '''
+    def __init__(self) -> None:
+        self._root = _TrieNode()
+        # header型匹配器按词首字符分桶：{前缀位置: {首字符: [key]}}
+        self._head_chars = {}
+        # 无法建立索引的匹配器，每个位置都是候选
+        self._always = []
+        self._depth = 0
+
+    @property
+    def depth(self):
+        return self._depth
+
+    def add_sequence(self, key, prefix: list):
+        '''前缀逐词相等，集合为可选项，None为任意词'''
+        if all(to_check is None for to_check in prefix):
+            self._always.append(key)
+            return
+
+        frontier = [self._root]
+        for to_check in prefix:
+            next_frontier = []
+            for node in frontier:
+                if to_check is None:
+                    next_frontier.append(node.wild_child())
+                elif isinstance(to_check, (set, frozenset)):
+                    for alt in to_check:
+                        next_frontier.append(node.child(alt))
+                else:
+                    next_frontier.append(node.child(to_check))
+            frontier = next_frontier
+
+        for node in frontier:
+            node.keys.append(key)
+        self._depth = max(self._depth, len(prefix))
+
+    def add_header(self, key, prefix: list):
+        '''前缀逐词以给定字符串开头，取第一个非空项的首字符分桶'''
+        for i, to_check in enumerate(prefix):
+            if to_check is None:
+                continue
+            if len(to_check) == 0:
+                break
+            bucket = self._head_chars.setdefault(i, {})
+            bucket.setdefault(to_check[0], []).append(key)
+            return
+        self._always.append(key)
+
+    def candidates(self, words: list, tokens: list, pos: int):
+        '''
+        返回pos处前缀可能成立的匹配器key集合
+        tokens为words归一化后的词，与add_sequence时前缀的取值一致（文本或TokenVocab编号）
+        '''
+        found = set(self._always)
+        w_len = len(tokens)
+
+        frontier = [self._root]
+        step = pos
+        while len(frontier) > 0 and step < w_len:
+            token = tokens[step]
+            next_frontier = []
+            for node in frontier:
+                nxt = node.edges.get(token)
+                if nxt is not None:
+                    next_frontier.append(nxt)
+                    found.update(nxt.keys)
+                if node.wild is not None:
+                    next_frontier.append(node.wild)
+                    found.update(node.wild.keys)
+            frontier = next_frontier
+            step += 1
+
+        for i, bucket in self._head_chars.items():
+            if pos + i >= w_len:
+                continue
+            text = words[pos + i][4]
+            if len(text) == 0:
+                continue
+            keys = bucket.get(text[0])
+            if keys is not None:
+                found.update(keys)
+
+        return found
@@ -0,0 +1,86 @@
+from bisect import bisect_left, bisect_right
+
+def bounded_distance(a: str, b: str, max_dist: int):
+    '''只计算对角线附近max_dist宽的编辑距离，超过max_dist时返回max_dist + 1'''
+    over = max_dist + 1
+    if abs(len(a) - len(b)) > max_dist:
+        return over
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [over] * len(b)
+        lo = max(1, i - max_dist)
+        hi = min(len(b), i + max_dist)
+        for j in range(lo, hi + 1):
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (a[i - 1] != b[j - 1]))
+        if min(cur[lo - 1:hi + 1]) > max_dist:
+            return over
+        prev = cur
+    return min(prev[len(b)], over)
+
+def max_label_dist(label: str):
+    '''
+    标签允许的最大编辑距离：len(label) > 2 * max_dist + 1时相近的文本至少保留一个二元组，
+    二元组索引才能过滤候选；也避免短标签（如“扬程”）命中任意一个字或只有一个字相同的词
+    '''
+    return max(0, (len(label) - 2) // 2)
+
+class GramIndex():
+    '''
+    单页归一化词首尾相接后的字符二元组倒排索引，用于查找与标签编辑距离不超过阈值的连续词；
+    标签分散在多个词中（如“流 量”）时同样可以命中
+    '''
+    def __init__(self, tokens: list) -> None:
+        self._starts = []
+        offset = 0
+        for token in tokens:
+            self._starts.append(offset)
+            offset += len(token)
+        self._starts.append(offset)
+        self._text = "".join(tokens)
+        self._grams = {}
+        for i in range(len(self._text) - 1):
+            self._grams.setdefault(self._text[i:i + 2], []).append(i)
+
+    def _words_starting_in(self, lo: int, hi: int):
+        '''起点字符偏移在[lo, hi]内的词序号'''
+        count = len(self._starts) - 1
+        first = bisect_left(self._starts, lo, 0, count)
+        last = bisect_right(self._starts, hi, 0, count)
+        return range(first, last)
+
+    def _candidates(self, label: str, max_dist: int):
+        # 每处编辑最多破坏两个二元组，相近的文本至少保留need个
+        need = len(label) - 1 - 2 * max_dist
+        if need <= 0:
+            # 标签太短，二元组无法过滤
+            return range(len(self._starts) - 1)
+        votes = {}
+        for p in range(len(label) - 1):
+            voted = set()
+            for offset in self._grams.get(label[p:p + 2], ()):
+                for w in self._words_starting_in(offset - p - max_dist, offset - p + max_dist):
+                    voted.add(w)
+            for w in voted:
+                votes[w] = votes.get(w, 0) + 1
+        return sorted(w for w, count in votes.items() if count >= need)
+
+    def find(self, label: str, max_dist: int):
+        '''
+        返回[(起始词, 结束词, 距离)]，按起始词排序；每个起始词取距离最小、最短的连续词
+        '''
+        result = []
+        count = len(self._starts) - 1
+        for w in self._candidates(label, max_dist):
+            best = None
+            for e in range(w, count):
+                length = self._starts[e + 1] - self._starts[w]
+                if length > len(label) + max_dist:
+                    break
+                if length < len(label) - max_dist:
+                    continue
+                dist = bounded_distance(label, self._text[self._starts[w]:self._starts[e + 1]], max_dist)
+                if dist <= max_dist and (best is None or dist < best[2]):
+                    best = (w, e, dist)
+            if best is not None:
+                result.append(best)
+        return result
@@ -0,0 +1,91 @@
+import json
+import os
+import traceback
+
+from .const_def import CACHE_DIR
+
+# 至少统计过这么多个泵后才使用历史数据
+MIN_SEGMENTS = 3
+
+class MatcherPriors():
+    '''
+    单个样式各匹配器的历史命中统计：命中次数、命中页在泵内的页序范围、命中词位置
+    '''
+    def __init__(self, segments: int = 0, stats: dict|None = None) -> None:
+        self._segments = segments
+        # 匹配器键 -> [命中次数, 最小页序, 最大页序, 词位置之和]
+        self._stats = stats if stats is not None else {}
+
+    @property
+    def segments(self):
+        return self._segments
+
+    @property
+    def ready(self):
+        return self._segments >= MIN_SEGMENTS
+
+    def start_segment(self):
+        self._segments += 1
+
+    def record(self, key: tuple, page_index: int, pos: int):
+        stat = self._stats.get(key)
+        if stat is None:
+            self._stats[key] = [1, page_index, page_index, pos]
+            return
+        stat[0] += 1
+        stat[1] = min(stat[1], page_index)
+        stat[2] = max(stat[2], page_index)
+        stat[3] += pos
+
+    def hit_rate(self, key: tuple):
+        stat = self._stats.get(key)
+        if stat is None or self._segments == 0:
+            return 0.0
+        return min(1.0, stat[0] / self._segments)
+
+    def to_dict(self):
+        return {
+            "segments": self._segments,
+            "stats": {f"{key[0]},{key[1]}": stat for key, stat in self._stats.items()},
+        }
+
+    @staticmethod
+    def from_dict(data: dict):
+        stats = {}
+        for name, stat in data["stats"].items():
+            i, j = name.split(",")
+            stats[(int(i), int(j))] = list(stat)
+        return MatcherPriors(data["segments"], stats)
+
+class PriorStore():
+    '''
+    按样式保存匹配器历史统计的目录，每个样式一个json文件
+    '''
+    def __init__(self, cache_dir: str|None = None) -> None:
+        if cache_dir is None:
+            cache_dir = os.path.join(CACHE_DIR, "priors")
+        self._cache_dir = cache_dir
+
+    def _path(self, key: str):
+        return os.path.join(self._cache_dir, key + ".json")
+
+    def load(self, key: str) -> MatcherPriors:
+        path = self._path(key)
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    return MatcherPriors.from_dict(json.load(f))
+            except Exception:
+                traceback.print_exc()
+        return MatcherPriors()
+
+    def save(self, key: str, priors: MatcherPriors):
+        try:
+            os.makedirs(self._cache_dir, exist_ok=True)
+            path = self._path(key)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(priors.to_dict(), f)
+            os.replace(tmp, path)
+        except Exception:
+            traceback.print_exc()
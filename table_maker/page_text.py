@@ -0,0 +1,209 @@
+import os
+from collections import OrderedDict
+import pymupdf
+
+from .file_style.token_trie import normalize_token
+from .file_style.basic import parse_numbers
+from .spatial_index import SpatialIndex, dedup_words
+from .fuzzy_index import GramIndex
+
+# 只提取文字：不含图片，连字保持原样不展开
+WORD_FLAGS = pymupdf.TEXTFLAGS_WORDS & ~pymupdf.TEXT_PRESERVE_IMAGES
+
+# 页面区域用途：页码识别、数据匹配、写回定位
+CLIP_ROLES = ("header", "data", "writeback")
+# 按区域提取时上下扩展的高度，跨越区域边界的词不会被截断
+CLIP_MARGIN = 72
+
+class PageText():
+    '''
+    单页的文本提取结果，页码识别、匹配和写回共用同一份词表
+    '''
+    __slots__ = ("_number", "_words", "_tokens", "_spatial", "_roles", "_complete", "_ids", "_grams", "_clips", "_dedup", "_numbers")
+
+    def __init__(self, number: int, words: list, tokens: list|None = None, complete: bool = True) -> None:
+        self._number = number
+        self._words = words
+        self._tokens = tokens
+        self._spatial = None
+        # 各用途区域内的词，未配置区域的用途使用整页
+        self._roles = {}
+        # 按区域并集提取时为False，此时words不是整页的词
+        self._complete = complete
+        # (TokenVocab, 词编号)，按最近使用的样式词表缓存
+        self._ids = None
+        self._grams = None
+        self._clips = ()
+        # (容差, 去重后的PageText)
+        self._dedup = None
+        self._numbers = None
+
+    @property
+    def number(self):
+        return self._number
+
+    @property
+    def words(self):
+        return self._words
+
+    @property
+    def tokens(self):
+        '''按匹配规则归一化后的词文本，首次使用时计算'''
+        if self._tokens is None:
+            self._tokens = [normalize_token(word[4]) for word in self._words]
+        return self._tokens
+
+    @property
+    def numbers(self):
+        '''(各词的数值, 有效标记)，首次使用时整页解析一次'''
+        if self._numbers is None:
+            self._numbers = parse_numbers(self._words)
+        return self._numbers
+
+    def token_ids(self, vocab):
+        '''按样式词表编码的词编号，与tokens一一对应'''
+        if self._ids is None or self._ids[0] is not vocab:
+            self._ids = (vocab, vocab.encode(self.tokens))
+        return self._ids[1]
+
+    @property
+    def complete(self):
+        return self._complete
+
+    def for_role(self, role: str):
+        return self._roles.get(role, self)
+
+    def set_clips(self, clips: tuple):
+        '''clips为((用途, (x0, y0, x1, y1)), ...)'''
+        self._clips = clips
+        self._roles = {}
+        for role, rect in clips:
+            self._roles[role] = PageText(self._number, clip_words(self._words, rect), complete=False)
+        return self
+
+    def with_clips(self, clips: tuple):
+        '''按另一样式的区域划分用途的页面，与本页共用词表和归一化词'''
+        if clips == self._clips:
+            return self
+        text = PageText(self._number, self._words, self.tokens, self._complete)
+        text._numbers = self._numbers
+        return text.set_clips(clips)
+
+    def deduped(self, tol: float):
+        '''去掉重叠的重复词后的页面，没有重复词时返回自身'''
+        if self._dedup is None or self._dedup[0] != tol:
+            words = dedup_words(self._words, tol)
+            text = self
+            if len(words) < len(self._words):
+                text = PageText(self._number, words, complete=self._complete).set_clips(self._clips)
+            self._dedup = (tol, text)
+        return self._dedup[1]
+
+    @property
+    def spatial(self) -> SpatialIndex:
+        '''词矩形的网格索引，供位置型匹配器使用'''
+        if self._spatial is None:
+            self._spatial = SpatialIndex(self._words)
+        return self._spatial
+
+    @property
+    def grams(self) -> GramIndex:
+        '''归一化词的字符二元组索引，供fuzzy型匹配器使用'''
+        if self._grams is None:
+            self._grams = GramIndex(self.tokens)
+        return self._grams
+
+def clip_words(words: list, rect: tuple):
+    '''
+    区域内的词：词矩形至少一半面积在区域内，词保持完整。
+    MuPDF按clip提取时逐字符裁剪，会截断跨越边界的词，所有按区域取词的地方都用本函数筛选
+    '''
+    x0, y0, x1, y1 = rect
+    result = []
+    for word in words:
+        w = max(0, min(x1, word[2]) - max(x0, word[0]))
+        h = max(0, min(y1, word[3]) - max(y0, word[1]))
+        area = max(0, word[2] - word[0]) * max(0, word[3] - word[1])
+        if w * h >= 0.5 * area:
+            result.append(word)
+    return result
+
+def _band_words(page: pymupdf.Page, y0: float, y1: float):
+    '''
+    提取整页宽度、y0到y1上下各扩展CLIP_MARGIN的横条内的词。
+    单行词的高度小于CLIP_MARGIN，被横条截断的词不可能有一半面积在y0到y1之间，
+    因此对结果用clip_words筛选与对整页的词筛选一致
+    '''
+    r = page.rect
+    clip = pymupdf.Rect(r.x0, y0 - CLIP_MARGIN, r.x1, y1 + CLIP_MARGIN)
+    textpage = page.get_textpage(clip=clip, flags=WORD_FLAGS)
+    words = page.get_text("words", sort=False, textpage=textpage)
+    del textpage
+    return words
+
+def extract_clip_words(page: pymupdf.Page, rect: tuple):
+    '''只提取rect附近的文字，结果与clip_words(整页的词, rect)相同'''
+    return clip_words(_band_words(page, rect[1], rect[3]), rect)
+
+def extract_page_text(page: pymupdf.Page, clips: tuple = ()) -> PageText:
+    if len(clips) > 0 and {role for role, _ in clips} >= set(CLIP_ROLES):
+        # 所有用途都配置了区域时，只提取区域并集附近的文字，各用途的词与整页提取时相同
+        rects = [rect for _, rect in clips]
+        words = _band_words(page, min(r[1] for r in rects), max(r[3] for r in rects))
+        return PageText(page.number, words, complete=False).set_clips(clips)
+    textpage = page.get_textpage(flags=WORD_FLAGS)
+    words = page.get_text("words", sort=False, textpage=textpage)
+    del textpage
+    return PageText(page.number, words).set_clips(clips)
+
+def extract_header_text(page: pymupdf.Page, rect: tuple) -> PageText:
+    '''只提取页码区域，用于跳页时判断是否为分段起点'''
+    return PageText(page.number, extract_clip_words(page, rect), complete=False)
+
+def document_key(pdf_doc: pymupdf.Document):
+    '''同一文件未修改时返回相同的键，内存中的文档不参与缓存'''
+    name = pdf_doc.name
+    if not name or not os.path.isfile(name):
+        return None
+    stat = os.stat(name)
+    return (os.path.abspath(name), stat.st_mtime_ns, stat.st_size)
+
+class PageTextCache():
+    '''
+    以(文档, 页号, 区域配置)为键的LRU缓存，提取与写回在同一会话中运行时可复用文本
+    '''
+    def __init__(self, capacity: int = 128) -> None:
+        self._capacity = capacity
+        self._items = OrderedDict()
+
+    @property
+    def capacity(self):
+        return self._capacity
+
+    def clear(self):
+        self._items.clear()
+
+    def get(self, doc_key, page_no: int, clips: tuple = ()) -> PageText|None:
+        if doc_key is None:
+            return None
+        key = (doc_key, page_no, clips)
+        text = self._items.get(key)
+        if text is not None:
+            self._items.move_to_end(key)
+        return text
+
+    def put(self, doc_key, text: PageText, clips: tuple = ()):
+        if doc_key is None or self._capacity <= 0:
+            return
+        key = (doc_key, text.number, clips)
+        self._items[key] = text
+        self._items.move_to_end(key)
+        while len(self._items) > self._capacity:
+            self._items.popitem(last=False)
+
+    def load(self, doc_key, page: pymupdf.Page, clips: tuple = ()) -> PageText:
+        text = self.get(doc_key, page.number, clips)
+        if text is None:
+            text = extract_page_text(page, clips)
+            self.put(doc_key, text, clips)
+        return text
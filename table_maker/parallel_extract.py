@@ -0,0 +1,87 @@
+from concurrent.futures import ProcessPoolExecutor
+import pymupdf
+
+from .file_style.base_matcher import BasicFileStyle
+from .file_style.compiled_style import CompiledStyle
+from .page_text import extract_page_text
+
+# 每个进程持有一个文档句柄和一个匹配器
+_worker_doc = None
+_worker_matcher = None
+
+def _init_worker(filepath: str, style: CompiledStyle):
+    global _worker_doc, _worker_matcher
+    _worker_doc = pymupdf.open(filepath)
+    _worker_matcher = BasicFileStyle()
+    _worker_matcher.load(style)
+
+def _extract_chunk(chunk: tuple):
+    '''
+    处理以第1页开始、落在[start, end)内的所有泵，最后一个泵向后读到下一个第1页为止；
+    start之前开始的泵由前一块负责
+    '''
+    start, end = chunk
+    page_count = _worker_doc.page_count
+    result = []
+
+    pno = start
+    if start > 0:
+        while pno < end:
+            text = extract_page_text(_worker_doc[pno], _worker_matcher.style.clips)
+            if _worker_matcher.is_segment_start(text):
+                break
+            pno += 1
+        else:
+            return result
+    else:
+        text = extract_page_text(_worker_doc[pno], _worker_matcher.style.clips)
+
+    # 上一块留下的匹配状态不能带入本块，第1页会重新填充队列
+    _worker_matcher.clear_queue()
+    while True:
+        _worker_matcher.parse(text, result)
+        pno += 1
+        # 当前泵已匹配完时，只探测页码区域直到下一个第1页
+        while pno < page_count and _worker_matcher.can_skip(pno, page=_worker_doc[pno]):
+            pno += 1
+        if pno >= page_count:
+            break
+        text = extract_page_text(_worker_doc[pno], _worker_matcher.style.clips)
+        if pno >= end and _worker_matcher.is_segment_start(text):
+            break
+    return result
+
+def _extract_segments(segments: list):
+    '''按分段表提取，每段是一个完整的泵，不需要识别页码边界'''
+    result = []
+    for first, last in segments:
+        _worker_matcher.clear_queue()
+        for pno in range(first, last):
+            if pno > first and _worker_matcher.exhausted:
+                break
+            _worker_matcher.parse(extract_page_text(_worker_doc[pno], _worker_matcher.style.clips), result)
+    return result
+
+def split_chunks(page_count: int, chunk_count: int):
+    size = max(1, -(-page_count // chunk_count))
+    return [(start, min(start + size, page_count)) for start in range(0, page_count, size)]
+
+def extract_parallel(filepath: str, style: CompiledStyle, workers: int, page_count: int, segments: list|None = None):
+    '''
+    按页数分块交给进程池，每块从块内第一个第1页开始提取，结果按文档顺序合并，与串行结果一致；
+    有分段表时按泵分块，各进程不再读取块外的页
+    '''
+    result = []
+    if page_count == 0:
+        return result
+    if segments is not None:
+        size = max(1, -(-len(segments) // (workers * 4)))
+        chunks = [segments[i:i + size] for i in range(0, len(segments), size)]
+        task = _extract_segments
+    else:
+        chunks = split_chunks(page_count, workers * 4)
+        task = _extract_chunk
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(filepath, style)) as pool:
+        for part in pool.map(task, chunks):
+            result.extend(part)
+    return result
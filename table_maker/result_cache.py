@@ -0,0 +1,103 @@
+import os
+import pickle
+import sqlite3
+import time
+import traceback
+
+from .const_def import CACHE_DIR
+from .word_store import cached_content_hash
+
+# 提取逻辑变化时递增，使旧结果失效
+EXTRACTOR_VERSION = 5
+
+class ResultCache():
+    '''
+    以(PDF内容哈希, 样式键, 提取逻辑版本)为键的提取结果缓存，保存在SQLite中，
+    总大小超过上限时按最近使用时间淘汰
+    '''
+    def __init__(self, path: str|None = None, max_bytes: int = 64 * 1024 * 1024) -> None:
+        if path is None:
+            path = os.path.join(CACHE_DIR, "results.sqlite")
+        self._path = path
+        self._max_bytes = max_bytes
+        self._conn = None
+        self._hits = 0
+        self._misses = 0
+
+    @property
+    def hits(self):
+        return self._hits
+
+    @property
+    def misses(self):
+        return self._misses
+
+    def stats(self):
+        return {"hits": self._hits, "misses": self._misses, "entries": self._count(), "bytes": self._total()}
+
+    def _connect(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self._path)), exist_ok=True)
+            self._conn = sqlite3.connect(self._path)
+            self._conn.execute("CREATE TABLE IF NOT EXISTS results ("
+                               "key TEXT PRIMARY KEY, data BLOB NOT NULL, size INTEGER NOT NULL, used REAL NOT NULL)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS results_used ON results (used)")
+            self._conn.commit()
+        return self._conn
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def content_key(self, filepath: str):
+        return cached_content_hash(filepath)
+
+    def result_key(self, filepath: str, style_key: str):
+        return f"{self.content_key(filepath)}:{style_key}:v{EXTRACTOR_VERSION}"
+
+    def get(self, key: str):
+        try:
+            conn = self._connect()
+            row = conn.execute("SELECT data FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self._misses += 1
+                return None
+            conn.execute("UPDATE results SET used = ? WHERE key = ?", (time.time(), key))
+            conn.commit()
+            self._hits += 1
+            return pickle.loads(row[0])
+        except Exception:
+            traceback.print_exc()
+            self._misses += 1
+            return None
+
+    def put(self, key: str, result: list):
+        try:
+            data = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+            conn = self._connect()
+            conn.execute("INSERT OR REPLACE INTO results (key, data, size, used) VALUES (?, ?, ?, ?)",
+                         (key, data, len(data), time.time()))
+            conn.commit()
+            self.evict()
+        except Exception:
+            traceback.print_exc()
+
+    def _count(self):
+        return self._connect().execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def _total(self):
+        return self._connect().execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+
+    def evict(self):
+        conn = self._connect()
+        total = self._total()
+        if total <= self._max_bytes:
+            return
+        rows = conn.execute("SELECT key, size FROM results ORDER BY used").fetchall()
+        for key, size in rows:
+            if total <= self._max_bytes:
+                break
+            conn.execute("DELETE FROM results WHERE key = ?", (key,))
+            total -= size
+        conn.commit()
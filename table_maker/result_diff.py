@@ -0,0 +1,38 @@
+from typing import NamedTuple
+
+class FieldDiff(NamedTuple):
+    '''
+    两次提取结果中同一泵同一参数的差异，某一侧没有该参数（或没有该泵）时值为None
+    '''
+    pump: int
+    index: tuple
+    name: str
+    left: object
+    right: object
+
+def _found_values(args):
+    if args is None:
+        return {}
+    values = {}
+    for index in args.found_args:
+        values[index] = args.get_arg(index[0], index[1]).value
+    return values
+
+def diff_results(left: list, right: list):
+    '''
+    逐泵逐参数比较两次提取的结果（MatchedArg列表），按泵序号和参数首次出现的顺序返回FieldDiff列表
+    '''
+    diffs = []
+    for n in range(max(len(left), len(right))):
+        a = left[n] if n < len(left) else None
+        b = right[n] if n < len(right) else None
+        a_values = _found_values(a)
+        b_values = _found_values(b)
+        for index in list(a_values) + [i for i in b_values if i not in a_values]:
+            a_value = a_values.get(index)
+            b_value = b_values.get(index)
+            if index in a_values and index in b_values and a_value == b_value:
+                continue
+            name = (a if index in a_values else b).get_arg(index[0], index[1]).name
+            diffs.append(FieldDiff(n, index, name, a_value, b_value))
+    return diffs
@@ -0,0 +1,119 @@
+import hashlib
+import os
+import pickle
+import traceback
+from collections import OrderedDict
+
+import pymupdf
+
+from .const_def import CACHE_DIR
+from .result_cache import EXTRACTOR_VERSION
+
+# 分段或提取逻辑变化时递增，使旧缓存失效
+SEGMENT_CACHE_VERSION = 3
+
+def page_content_hash(page: pymupdf.Page):
+    '''
+    页面内容流、资源字典、所用字体和外部对象的定义，以及页面尺寸的哈希，
+    内容未变的页在修订版中哈希不变
+    '''
+    doc = page.parent
+    sha = hashlib.sha256()
+    sha.update(page.read_contents())
+    kind, value = doc.xref_get_key(page.xref, "Resources")
+    if kind == "xref":
+        value = doc.xref_object(int(value.split()[0]), compressed=True)
+    sha.update(value.encode("utf-8"))
+    for font in page.get_fonts():
+        sha.update(doc.xref_object(font[0], compressed=True).encode("utf-8"))
+    for xobject in page.get_xobjects():
+        sha.update(doc.xref_stream_raw(xobject[0]) or b"")
+    sha.update(repr((tuple(page.mediabox), page.rotation)).encode("ascii"))
+    return sha.hexdigest()
+
+class SegmentCache():
+    '''
+    按内容寻址的分段结果缓存：
+    每个泵的提取结果以(样式键, 泵内各页哈希)为键保存；
+    每页是否为第1页以start_key为键保存，修订版中未变的页不需再提取文字
+    '''
+    def __init__(self, cache_dir: str|None = None, max_starts: int = 50000) -> None:
+        if cache_dir is None:
+            cache_dir = os.path.join(CACHE_DIR, "segments")
+        self._cache_dir = cache_dir
+        # 页是否为第1页的记录数上限，超出时淘汰最久未用的
+        self._max_starts = max_starts
+        self._starts = None
+        self._dirty = False
+
+    @staticmethod
+    def segment_key(style_key: str, hashes: list):
+        '''style_key需区分配置、样式和是否使用历史统计，提取逻辑版本变化时旧结果不再命中'''
+        sha = hashlib.sha256()
+        sha.update(f"v{SEGMENT_CACHE_VERSION}:e{EXTRACTOR_VERSION}:{style_key}".encode("utf-8"))
+        for page_hash in hashes:
+            sha.update(page_hash.encode("ascii"))
+        return sha.hexdigest()
+
+    @staticmethod
+    def start_key(page_num: str, header, dedup, page_hash: str):
+        '''页是否为第1页取决于页码格式、页码区域、去重容差和页内容，版本变化时旧记录不再命中'''
+        return (SEGMENT_CACHE_VERSION, page_num, header, dedup, page_hash)
+
+    def _path(self, name: str):
+        return os.path.join(self._cache_dir, name + ".pickle")
+
+    def _read(self, name: str):
+        path = self._path(name)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "rb") as f:
+                return pickle.load(f)
+        except Exception:
+            traceback.print_exc()
+            return None
+
+    def _write(self, name: str, value):
+        try:
+            os.makedirs(self._cache_dir, exist_ok=True)
+            path = self._path(name)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        except Exception:
+            traceback.print_exc()
+
+    def load(self, key: str):
+        return self._read(key)
+
+    def save(self, key: str, args):
+        self._write(key, args)
+
+    def _load_starts(self):
+        if self._starts is None:
+            self._starts = OrderedDict(self._read("starts") or {})
+        return self._starts
+
+    def is_start(self, page_key: tuple):
+        '''page_key由start_key生成，未记录时返回None'''
+        starts = self._load_starts()
+        value = starts.get(page_key)
+        if value is not None:
+            starts.move_to_end(page_key)
+        return value
+
+    def set_start(self, page_key: tuple, value: bool):
+        starts = self._load_starts()
+        starts[page_key] = value
+        starts.move_to_end(page_key)
+        while len(starts) > self._max_starts:
+            starts.popitem(last=False)
+        self._dirty = True
+
+    def flush(self):
+        '''有新记录时才写回'''
+        if self._starts is not None and self._dirty:
+            self._write("starts", self._starts)
+            self._dirty = False
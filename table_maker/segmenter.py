@@ -0,0 +1,34 @@
+import pymupdf
+
+from .page_text import PageText, extract_page_text, extract_clip_words
+
+def _parse_page(matcher, text: PageText):
+    try:
+        return matcher.parse_page(matcher.prepare(text))
+    except Exception:
+        # 与parse一致，页码识别出错视为没有页码
+        return None
+
+def page_number(matcher, page: pymupdf.Page):
+    '''
+    与parse相同规则识别的页码，识别不出时返回None：
+    配置了页码区域时只读该区域（与for_role("header")同样按clip_words取词），否则读整页
+    '''
+    clips = matcher.style.clips
+    header = dict(clips).get("header")
+    if header is not None:
+        return _parse_page(matcher, PageText(page.number, extract_clip_words(page, header), complete=False))
+    return _parse_page(matcher, extract_page_text(page, clips))
+
+def segment_document(pdf_doc: pymupdf.Document, matcher):
+    '''
+    分段表：第i个泵所在的页范围[起始页, 结束页)，第一个第1页之前的页不属于任何泵。
+    分段表用于跳页，必须与parse识别的页码一致，因此不使用页面标签（标签通常全文连续编号），
+    也不只读页眉页脚（正文中的“第 N 页”在整页词序中可能先出现）
+    '''
+    starts = [page.number for page in pdf_doc if page_number(matcher, page) == 1]
+    table = []
+    for i, first in enumerate(starts):
+        last = starts[i + 1] if i + 1 < len(starts) else pdf_doc.page_count
+        table.append((first, last))
+    return table
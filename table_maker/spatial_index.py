@@ -0,0 +1,90 @@
+import math
+
+class SpatialIndex():
+    '''
+    单页词矩形的网格索引，每个词登记到其矩形覆盖的所有网格，用于查找标签右侧或下方最近的词
+    '''
+    def __init__(self, words: list, cell: float = 40.0) -> None:
+        self._words = words
+        self._cell = cell
+        self._grid = {}
+        for i, word in enumerate(words):
+            for cx in range(self._col(word[0]), self._col(word[2]) + 1):
+                for cy in range(self._col(word[1]), self._col(word[3]) + 1):
+                    self._grid.setdefault((cx, cy), []).append(i)
+
+    def _col(self, value: float):
+        return math.floor(value / self._cell)
+
+    def _nearest(self, idx: int, max_dist: float, ignore, horizontal: bool):
+        x0, y0, x1, y1 = self._words[idx][0:4]
+        if horizontal:
+            # 沿x方向逐列查找，行范围为标签的上下边界
+            start, end = x1, x1 + max_dist
+            band = range(self._col(y0), self._col(y1) + 1)
+        else:
+            start, end = y1, y1 + max_dist
+            band = range(self._col(x0), self._col(x1) + 1)
+
+        best = None
+        best_dist = None
+        for step in range(self._col(start), self._col(end) + 1):
+            if best_dist is not None and step * self._cell > start + best_dist:
+                break
+            for other in band:
+                key = (step, other) if horizontal else (other, step)
+                for i in self._grid.get(key, ()):
+                    if i == idx:
+                        continue
+                    word = self._words[i]
+                    if ignore is not None and word[4] in ignore:
+                        continue
+                    if horizontal:
+                        dist = word[0] - x1
+                        overlap = min(y1, word[3]) - max(y0, word[1])
+                        size = min(y1 - y0, word[3] - word[1])
+                    else:
+                        dist = word[1] - y1
+                        overlap = min(x1, word[2]) - max(x0, word[0])
+                        size = min(x1 - x0, word[2] - word[0])
+                    # 允许少量重叠，另一方向需重叠过半
+                    if dist < -1 or dist > max_dist or overlap < size / 2:
+                        continue
+                    if best_dist is None or dist < best_dist or (dist == best_dist and i < best):
+                        best = i
+                        best_dist = dist
+        return best
+
+    def right_of(self, idx: int, max_dist: float, ignore=None):
+        '''idx右侧同一行最近的词序号'''
+        return self._nearest(idx, max_dist, ignore, True)
+
+    def below(self, idx: int, max_dist: float, ignore=None):
+        '''idx下方同一列最近的词序号'''
+        return self._nearest(idx, max_dist, ignore, False)
+
+def dedup_words(words: list, tol: float = 1.0):
+    '''
+    去掉与前面某个词文本相同、四边坐标相差都不超过tol的词（重复绘制模拟粗体），保留第一次出现的；
+    按(文本, 左上角所在网格)散列，只比较相邻网格，一次线性扫描
+    '''
+    grid = {}
+    kept = []
+    for word in words:
+        cx = math.floor(word[0] / tol)
+        cy = math.floor(word[1] / tol)
+        duplicated = False
+        for gx in (cx - 1, cx, cx + 1):
+            for gy in (cy - 1, cy, cy + 1):
+                for other in grid.get((gx, gy, word[4]), ()):
+                    if all(abs(other[k] - word[k]) <= tol for k in range(4)):
+                        duplicated = True
+                        break
+                if duplicated:
+                    break
+            if duplicated:
+                break
+        if not duplicated:
+            kept.append(word)
+            grid.setdefault((cx, cy, word[4]), []).append(word)
+    return kept
@@ -0,0 +1,53 @@
+import hashlib
+import os
+import pickle
+import traceback
+
+from .const_def import CACHE_DIR
+from .file_style.compiled_style import CompiledConfig
+
+# 编译逻辑变化时递增，使旧缓存失效
+STYLE_COMPILER_VERSION = 11
+
+class StyleCache():
+    '''
+    以配置文件内容哈希为键，缓存编译后的样式
+    '''
+    def __init__(self, cache_dir: str|None = None) -> None:
+        if cache_dir is None:
+            cache_dir = os.path.join(CACHE_DIR, "styles")
+        self._cache_dir = cache_dir
+
+    @staticmethod
+    def content_key(raw: bytes):
+        sha = hashlib.sha256()
+        sha.update(f"v{STYLE_COMPILER_VERSION}:".encode("ascii"))
+        sha.update(raw)
+        return sha.hexdigest()
+
+    def _path(self, key: str):
+        return os.path.join(self._cache_dir, key + ".pickle")
+
+    def load(self, key: str) -> CompiledConfig|None:
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "rb") as f:
+                compiled = pickle.load(f)
+            if isinstance(compiled, CompiledConfig):
+                return compiled
+        except Exception:
+            traceback.print_exc()
+        return None
+
+    def save(self, key: str, compiled: CompiledConfig):
+        try:
+            os.makedirs(self._cache_dir, exist_ok=True)
+            path = self._path(key)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                pickle.dump(compiled, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        except Exception:
+            traceback.print_exc()
@@ -0,0 +1,268 @@
+from bisect import bisect_left
+import hashlib
+import mmap
+import os
+import struct
+import traceback
+
+from .const_def import CACHE_DIR
+from .page_text import PageText
+
+# 文档词表的二进制缓存文件，小端序，可直接mmap读取：
+# 头部      magic, 版本, 页数, 7个段的(偏移, 长度)
+# PAGES     每页(起始词序号 u32, 词数 u32)
+# WORDS     每词(x0, y0, x1, y1 f64, 块号, 行号, 词号 i32, 文本偏移 u32, 文本长度 u32, 归一化词编号 u32)
+# BLOB      UTF-8文本
+# TOK_KEYS  每个归一化词(文本偏移 u32, 文本长度 u32, 倒排起点 u32, 倒排数量 u32)，按文本排序
+# TOK_POST  倒排项 u64，高32位页号，低32位词位置
+# HEAD_KEYS 每个词首字符，结构同TOK_KEYS
+# HEAD_POST 同TOK_POST
+_MAGIC = b"TMWS"
+_VERSION = 2
+_HEADER = struct.Struct("<4sII" + "QQ" * 7)
+_PAGE = struct.Struct("<II")
+_WORD = struct.Struct("<4d3iIII")
+_KEY = struct.Struct("<IIII")
+_POST = struct.Struct("<Q")
+
+_PAGES, _WORDS, _BLOB, _TOK_KEYS, _TOK_POST, _HEAD_KEYS, _HEAD_POST = range(7)
+
+def file_content_hash(filepath: str):
+    sha = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+# (路径, 修改时间, 大小) -> 内容哈希，词表缓存与结果缓存共用
+_content_hashes = {}
+
+def cached_content_hash(filepath: str):
+    '''文件未修改时直接返回上次计算的内容哈希'''
+    stat = os.stat(filepath)
+    stamp = (os.path.abspath(filepath), stat.st_mtime_ns, stat.st_size)
+    key = _content_hashes.get(stamp)
+    if key is None:
+        key = file_content_hash(filepath)
+        _content_hashes[stamp] = key
+    return key
+
+class _BlobWriter():
+    def __init__(self) -> None:
+        self._parts = []
+        self._size = 0
+        self._offsets = {}
+
+    def add(self, text: str):
+        found = self._offsets.get(text)
+        if found is not None:
+            return found
+        data = text.encode("utf-8")
+        found = (self._size, len(data))
+        self._offsets[text] = found
+        self._parts.append(data)
+        self._size += len(data)
+        return found
+
+    def to_bytes(self):
+        return b"".join(self._parts)
+
+def _pack_postings(postings: dict, blob: _BlobWriter):
+    keys = bytearray()
+    posts = bytearray()
+    count = 0
+    for key in sorted(postings):
+        entries = postings[key]
+        off, length = blob.add(key)
+        keys += _KEY.pack(off, length, count, len(entries))
+        for page_no, pos in entries:
+            posts += _POST.pack((page_no << 32) | pos)
+        count += len(entries)
+    return bytes(keys), bytes(posts)
+
+def write_store(path: str, texts: list[PageText]):
+    postings = {}
+    heads = {}
+    for page_no, text in enumerate(texts):
+        for pos, (word, token) in enumerate(zip(text.words, text.tokens)):
+            postings.setdefault(token, []).append((page_no, pos))
+            if len(word[4]) > 0:
+                heads.setdefault(word[4][0], []).append((page_no, pos))
+    # 归一化词编号即其在TOK_KEYS中的序号
+    token_ids = {token: i for i, token in enumerate(sorted(postings))}
+
+    blob = _BlobWriter()
+    pages = bytearray()
+    words = bytearray()
+    word_count = 0
+    for text in texts:
+        pages += _PAGE.pack(word_count, len(text.words))
+        for word, token in zip(text.words, text.tokens):
+            off, length = blob.add(word[4])
+            words += _WORD.pack(word[0], word[1], word[2], word[3], word[5], word[6], word[7], off, length, token_ids[token])
+        word_count += len(text.words)
+
+    tok_keys, tok_post = _pack_postings(postings, blob)
+    head_keys, head_post = _pack_postings(heads, blob)
+    sections = [bytes(pages), bytes(words), None, tok_keys, tok_post, head_keys, head_post]
+    sections[_BLOB] = blob.to_bytes()
+
+    table = []
+    offset = _HEADER.size
+    for data in sections:
+        # 每段按8字节对齐，便于按u64访问
+        offset = (offset + 7) & ~7
+        table.extend((offset, len(data)))
+        offset += len(data)
+
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, _VERSION, len(texts), *table))
+        for i, data in enumerate(sections):
+            f.write(b"\0" * (table[i * 2] - f.tell()))
+            f.write(data)
+    os.replace(tmp, path)
+
+class StoredDocument():
+    '''
+    mmap打开的词表缓存，可按页还原PageText，并直接作为文档倒排索引使用
+    '''
+    def __init__(self, path: str) -> None:
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self._file.close()
+            raise
+        header = _HEADER.unpack_from(self._map, 0)
+        if header[0] != _MAGIC or header[1] != _VERSION:
+            self.close()
+            raise ValueError("word store version mismatch")
+        self._page_count = header[2]
+        self._sections = [(header[3 + i * 2], header[4 + i * 2]) for i in range(7)]
+        self._tokens = None
+        self._token_ids = None
+        self._head_ids = None
+
+    @property
+    def page_count(self):
+        return self._page_count
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def _view(self, section: int):
+        offset, length = self._sections[section]
+        return memoryview(self._map)[offset:offset + length]
+
+    def _text(self, off: int, length: int):
+        base = self._sections[_BLOB][0] + off
+        return self._map[base:base + length].decode("utf-8")
+
+    def _load_keys(self, section: int):
+        keys = {}
+        for i, (off, length, start, count) in enumerate(_KEY.iter_unpack(self._view(section))):
+            keys[self._text(off, length)] = (i, start, count)
+        return keys
+
+    def _load_tokens(self):
+        if self._tokens is None:
+            self._token_ids = self._load_keys(_TOK_KEYS)
+            self._tokens = [None] * len(self._token_ids)
+            for token, (i, _, _) in self._token_ids.items():
+                self._tokens[i] = token
+        return self._tokens
+
+    def page_text(self, page_no: int) -> PageText:
+        start, count = _PAGE.unpack_from(self._view(_PAGES), page_no * _PAGE.size)
+        view = self._view(_WORDS)[start * _WORD.size:(start + count) * _WORD.size]
+        tokens = self._load_tokens()
+        words = []
+        page_tokens = []
+        for x0, y0, x1, y1, block, line, word_no, off, length, token_id in _WORD.iter_unpack(view):
+            words.append((x0, y0, x1, y1, self._text(off, length), block, line, word_no))
+            page_tokens.append(tokens[token_id])
+        return PageText(page_no, words, page_tokens)
+
+    def _positions(self, keys: dict, post_section: int, key: str, page_no: int):
+        found = keys.get(key)
+        if found is None:
+            return []
+        _, start, count = found
+        posts = self._view(post_section)[start * 8:(start + count) * 8].cast("Q")
+        lo = bisect_left(posts, page_no << 32)
+        hi = bisect_left(posts, (page_no + 1) << 32)
+        return [entry & 0xFFFFFFFF for entry in posts[lo:hi]]
+
+    def positions(self, token: str, page_no: int):
+        self._load_tokens()
+        return self._positions(self._token_ids, _TOK_POST, token, page_no)
+
+    def head_positions(self, char: str, page_no: int):
+        if self._head_ids is None:
+            self._head_ids = self._load_keys(_HEAD_KEYS)
+        return self._positions(self._head_ids, _HEAD_POST, char, page_no)
+
+    def has_token(self, token: str):
+        self._load_tokens()
+        return token in self._token_ids
+
+class WordStore():
+    '''
+    以PDF内容哈希为键的词表缓存目录，总大小超过上限时按最近使用时间淘汰
+    '''
+    def __init__(self, cache_dir: str|None = None, max_bytes: int = 512 * 1024 * 1024) -> None:
+        if cache_dir is None:
+            cache_dir = os.path.join(CACHE_DIR, "words")
+        self._cache_dir = cache_dir
+        self._max_bytes = max_bytes
+
+    def content_key(self, filepath: str):
+        return cached_content_hash(filepath)
+
+    def _path(self, key: str):
+        return os.path.join(self._cache_dir, key + ".words")
+
+    def open(self, key: str) -> StoredDocument|None:
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            stored = StoredDocument(path)
+            os.utime(path)
+            return stored
+        except Exception:
+            traceback.print_exc()
+            return None
+
+    def save(self, key: str, texts: list[PageText]):
+        try:
+            os.makedirs(self._cache_dir, exist_ok=True)
+            write_store(self._path(key), texts)
+            self.evict()
+        except Exception:
+            traceback.print_exc()
+
+    def evict(self):
+        entries = []
+        total = 0
+        for name in os.listdir(self._cache_dir):
+            if not name.endswith(".words"):
+                continue
+            path = os.path.join(self._cache_dir, name)
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self._max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                # 其他进程仍在使用
+                pass
@@ -0,0 +1,43 @@
+from table_maker.file_style.base_matcher import BasicFileStyle
+from table_maker.matcher_priors import MatcherPriors, MIN_SEGMENTS
+from table_maker.page_text import PageText
+
+def make_matcher(extract: list):
+    conf = {
+        "page_num": "header",
+        "extract": {"matchers": extract},
+        "writeback": {"matchers": [], "font_size": 10, "h_pos": 0, "v_pos": 0, "font_color": "red"},
+    }
+    matcher = BasicFileStyle()
+    matcher.setup(conf)
+    return matcher
+
+def make_page(number: int, text: str):
+    words = [(i * 20.0, 0.0, i * 20.0 + 16.0, 10.0, word, 0, 0, i) for i, word in enumerate(text.split())]
+    return PageText(number, words)
+
+def test_postfix_past_page_end_fails_alone():
+    # 页面在“型号 X m”之后被截断，后缀的第二项落在页外
+    matcher = make_matcher([
+        [],
+        [],
+        [None, {"type": "list", "pre": ["型号"], "post": [None, "m"]}, None, {"type": "regex", "pattern": r"P-(\d+)"}],
+        [],
+    ])
+    result = []
+    matcher.parse(make_page(0, "页码：1 P-12 型号 X m"), result)
+    assert len(result) == 1
+    assert result[0].display_list == [("泵材质", None, "12")]
+
+def test_refresh_priors_after_enough_segments():
+    matcher = make_matcher([[{"type": "list", "pre": ["位号"]}, {"type": "list", "pre": ["泵名称"]}], [], [], []])
+    priors = MatcherPriors()
+    matcher.set_priors(priors, True)
+    assert not matcher._use_priors
+    for _ in range(MIN_SEGMENTS):
+        priors.start_segment()
+        priors.record((0, 1), 0, 5)
+    # 统计足够后，下一次提取开始时生效，命中率高的排在前面
+    matcher.refresh_priors()
+    assert matcher._use_priors
+    assert matcher._rank[(0, 1)] < matcher._rank[(0, 0)]
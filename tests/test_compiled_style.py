@@ -0,0 +1,22 @@
+import pytest
+
+from table_maker.file_style.compiled_style import DEFAULT_DEDUP_TOL, StyleConfigError, compile_dedup, compile_matcher
+
+@pytest.mark.parametrize("pattern", [r"(\d)-\1", r"(?P<value>\d+)", r"(a)?(?(1)b|c)", r"(\d+"])
+def test_regex_rejects_group_references(pattern):
+    with pytest.raises(StyleConfigError):
+        compile_matcher((0, 1), {"type": "regex", "pattern": pattern})
+
+@pytest.mark.parametrize("pattern", [r"型号 (\S+)", r"[\1]", r"\\1", r"P-(\d+)"])
+def test_regex_accepts_plain_groups(pattern):
+    spec = compile_matcher((0, 1), {"type": "regex", "pattern": pattern})
+    assert spec.pattern == pattern
+
+@pytest.mark.parametrize("value", [0, -1, "1"])
+def test_dedup_rejects_non_positive_tolerance(value):
+    with pytest.raises(StyleConfigError):
+        compile_dedup(value)
+
+@pytest.mark.parametrize("value, expected", [(None, None), (False, None), (True, DEFAULT_DEDUP_TOL), (2, 2.0), (0.5, 0.5)])
+def test_dedup_tolerance(value, expected):
+    assert compile_dedup(value) == expected
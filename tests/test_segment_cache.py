@@ -0,0 +1,28 @@
+import os
+
+from table_maker.segment_cache import SegmentCache
+
+def test_starts_capped_and_persisted(tmp_path):
+    cache = SegmentCache(str(tmp_path), max_starts=3)
+    keys = [cache.start_key("default", None, None, f"h{i}") for i in range(4)]
+    for key in keys[:3]:
+        cache.set_start(key, False)
+    # 命中的记录移到最近使用
+    assert cache.is_start(keys[0]) is False
+    cache.set_start(keys[3], True)
+    cache.flush()
+
+    cache = SegmentCache(str(tmp_path), max_starts=3)
+    assert cache.is_start(keys[1]) is None
+    assert cache.is_start(keys[0]) is False
+    assert cache.is_start(keys[3]) is True
+
+def test_flush_without_changes_does_not_write(tmp_path):
+    cache = SegmentCache(str(tmp_path))
+    cache.is_start(cache.start_key("default", None, None, "h"))
+    cache.flush()
+    assert not os.path.exists(os.path.join(str(tmp_path), "starts.pickle"))
+
+def test_segment_key_separates_style_keys():
+    hashes = ["a", "b"]
+    assert SegmentCache.segment_key("conf-0-p0", hashes) != SegmentCache.segment_key("conf-0-p1", hashes)
@@ -0,0 +1,64 @@
+import pymupdf
+import pytest
+
+from table_maker.file_style.base_matcher import BasicFileStyle
+from table_maker.page_text import extract_page_text, extract_clip_words, PageText
+from table_maker.segmenter import segment_document
+
+def make_style(clip: dict|None = None):
+    conf = {
+        "page_num": "default",
+        "extract": {"matchers": [[], [], [], []]},
+        "writeback": {"matchers": [], "font_size": 10, "h_pos": 0, "v_pos": 0, "font_color": "red"},
+    }
+    if clip is not None:
+        conf["clip"] = clip
+    matcher = BasicFileStyle()
+    matcher.setup(conf)
+    return matcher
+
+def put(page: pymupdf.Page, y: float, text: str):
+    x = 72
+    for word in text.split():
+        page.insert_text((x, y), word, fontname="china-s", fontsize=10)
+        x += 12 * len(word) + 8
+
+@pytest.fixture
+def pdf_doc():
+    doc = pymupdf.open()
+    for number, body in [("第 1 页", None), ("第 2 页", None), ("第 3 页", "详见 第 1 页"), ("第 1 页", None), ("第 2 页", None)]:
+        page = doc.new_page()
+        if body is not None:
+            # 正文先于页眉写入，整页词序中先出现
+            put(page, 400, body)
+        put(page, 30, number)
+    yield doc
+    doc.close()
+
+def parse_starts(matcher, pdf_doc):
+    '''逐页parse时开始新泵的页'''
+    result = []
+    starts = []
+    for page in pdf_doc:
+        count = len(result)
+        matcher.parse(extract_page_text(page, matcher.style.clips), result)
+        if len(result) > count:
+            starts.append(page.number)
+    return starts
+
+def test_segments_follow_parse_not_bands(pdf_doc):
+    matcher = make_style()
+    # 只读页眉时第3页是“第 3 页”，整页词序中先出现正文的“第 1 页”
+    band = PageText(2, extract_clip_words(pdf_doc[2], (0, 0, pdf_doc[2].rect.x1, 100)), complete=False)
+    assert matcher.parse_page(band) == 3
+
+    starts = parse_starts(make_style(), pdf_doc)
+    assert starts == [0, 2, 3]
+    assert segment_document(pdf_doc, matcher) == [(0, 2), (2, 3), (3, 5)]
+
+def test_segments_with_header_clip(pdf_doc):
+    clip = {"header": [0, 0, pdf_doc[0].rect.x1, 100]}
+    matcher = make_style(clip)
+    starts = parse_starts(make_style(clip), pdf_doc)
+    assert starts == [0, 3]
+    assert segment_document(pdf_doc, matcher) == [(0, 3), (3, 5)]
@@ -0,0 +1,81 @@
+import os
+import struct
+
+import pytest
+
+from table_maker.doc_index import DocumentIndex
+from table_maker.page_text import PageText
+from table_maker.word_store import StoredDocument, WordStore, write_store
+
+def make_page(number: int, texts: list):
+    words = [(10.0 * i, 20.5, 10.0 * i + 8.25, 30.0, text, number, i // 4, i % 4) for i, text in enumerate(texts)]
+    return PageText(number, words)
+
+@pytest.fixture
+def pages():
+    return [
+        make_page(0, ["第", "1", "页", "泵名称", "循环泵1"]),
+        make_page(1, ["流量:", "m³/h", "１２０", "", "扬程", "m", "50.5"]),
+        make_page(2, []),
+        make_page(3, ["流量", "扬程：", "型号", "ABC-1"]),
+    ]
+
+def test_round_trip(tmp_path, pages):
+    path = str(tmp_path / "doc.words")
+    write_store(path, pages)
+    stored = StoredDocument(path)
+    try:
+        assert stored.page_count == len(pages)
+        index = DocumentIndex()
+        for page in pages:
+            index.add_page(page)
+            restored = stored.page_text(page.number)
+            assert restored.number == page.number
+            assert restored.words == page.words
+            assert restored.tokens == page.tokens
+        # 与内存中的文档索引给出相同的位置
+        for token in {token for page in pages for token in page.tokens}:
+            assert stored.has_token(token)
+            for page in pages:
+                assert stored.positions(token, page.number) == index.positions(token, page.number)
+        for char in {word[4][0] for page in pages for word in page.words if len(word[4]) > 0}:
+            for page in pages:
+                assert stored.head_positions(char, page.number) == index.head_positions(char, page.number)
+        assert not stored.has_token("不存在")
+        assert stored.positions("不存在", 0) == []
+    finally:
+        stored.close()
+
+def test_version_mismatch(tmp_path, pages):
+    store = WordStore(str(tmp_path))
+    store.save("doc", pages)
+    path = os.path.join(str(tmp_path), "doc.words")
+    with open(path, "r+b") as f:
+        f.seek(4)
+        version = struct.unpack("<I", f.read(4))[0]
+        f.seek(4)
+        f.write(struct.pack("<I", version + 1))
+    with pytest.raises(ValueError):
+        StoredDocument(path)
+    # 版本不符的缓存视为未命中
+    assert store.open("doc") is None
+
+def test_bad_magic(tmp_path, pages):
+    path = str(tmp_path / "doc.words")
+    write_store(path, pages)
+    with open(path, "r+b") as f:
+        f.write(b"XXXX")
+    with pytest.raises(ValueError):
+        StoredDocument(path)
+
+def test_evict_oldest_over_cap(tmp_path, pages):
+    store = WordStore(str(tmp_path))
+    store.save("old", pages)
+    size = os.path.getsize(os.path.join(str(tmp_path), "old.words"))
+    os.utime(os.path.join(str(tmp_path), "old.words"), (1, 1))
+    store = WordStore(str(tmp_path), max_bytes=size + size // 2)
+    store.save("new", pages)
+    assert sorted(os.listdir(str(tmp_path))) == ["new.words"]
+    stored = store.open("new")
+    assert stored is not None
+    stored.close()